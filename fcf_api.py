@@ -0,0 +1,401 @@
+"""API HTTP local (JSON) sobre el motor de flujo de caja.
+
+Uso:
+    python fcf_api.py --host 127.0.0.1 --puerto 8502
+
+Endpoints:
+    GET  /salud                     estado del servicio y backend de los núcleos
+    GET  /metrics                   métricas en formato de texto de Prometheus
+    POST /flujo                     flujo de caja mes a mes
+    POST /kpis                      indicadores del flujo
+    POST /reinversion-automatica    reinversiones Colocación automáticas
+    POST /estres                    flujos bajo escenarios de estrés con nombre
+    POST /contribuciones            matriz dispersa (CSR) cohorte × mes
+
+Cada POST recibe los parámetros de generar_flujo como objeto JSON (incluidas
+las "curvas" de mora por antigüedad, ver fcf_engine.no_cobro_celdas), o un lote
+con la forma {"escenarios": [{...}, {...}]}, en cuyo caso responde
+{"resultados": [...]} en el mismo orden.
+"""
+import argparse
+import json
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fcf_engine import (
+    CAMPOS_REINVERSION,
+    COLUMNAS_FLUJO,
+    calcular_contribuciones,
+    calcular_kpis,
+    calcular_kpis_escenarios,
+    calcular_operaciones,
+    calcular_reinversiones_automaticas,
+    crear_reinversion,
+    generar_flujo,
+    generar_flujos_estres,
+    top_contribuciones_mes,
+)
+from fcf_kernels import backend_activo
+from fcf_metricas import (
+    API_SEGUNDOS,
+    API_SOLICITUDES,
+    REGISTRO,
+    REINVERSION_AUTOMATICA,
+    REINVERSION_AUTOMATICA_SEGUNDOS,
+    REINVERSIONES_AUTOMATICAS_AGREGADAS,
+    medir_tiempo,
+)
+
+# Valores por defecto de la interfaz para los parámetros no enviados
+PARAMETROS_POR_DEFECTO = {
+    "inv_inicial": 300000000,
+    "costo_inicial": 6000000,
+    "cuotas_inicial": 14,
+    "importe_inicial": 1500000,
+    "meses_sin_cobros_inicial": 6,
+    "cuotas_regulacion_inicial": 5,
+    "importe_regulacion_inicial": 500000,
+    "pct_distribucion_inicial": 40,
+    "no_cobro_inicial": 0.0,
+    "meses_demora_inicial": 0,
+    "pago_mensual": 5000000,
+    "meses_pago": 60,
+    "meses_total": 100,
+    "exacto": False,
+    "curvas": None,
+}
+
+# Plantilla por defecto de la reinversión Colocación automática
+COLOCACION_POR_DEFECTO = {
+    "inversion": 6000000,
+    "costo_op": 6000000,
+    "cuotas": 14,
+    "importe": 1500000,
+    "meses_sin_cobros": 6,
+    "cuotas_regulacion": 5,
+    "importe_regulacion": 500000,
+    "pct_distribucion": 40,
+    "no_cobro": 0.0,
+    "meses_demora": 0,
+    "piso_caja": 0,
+}
+
+
+class SolicitudInvalida(ValueError):
+    """Error en los datos recibidos; se responde con 400"""
+
+
+def _leer_reinversion(datos):
+    """Normalizar una reinversión recibida por JSON"""
+    if not isinstance(datos, dict):
+        raise SolicitudInvalida("Cada reinversión debe ser un objeto")
+    datos = dict(datos)
+    if "ops" not in datos and "costo_op" in datos:
+        datos["ops"] = calcular_operaciones(datos["inversion"], datos["costo_op"])
+    faltantes = [campo for campo in CAMPOS_REINVERSION if campo not in datos]
+    if faltantes:
+        raise SolicitudInvalida(f"Faltan campos en la reinversión: {', '.join(faltantes)}")
+    if not isinstance(datos.get("automatica", False), bool):
+        raise SolicitudInvalida("'automatica' debe ser true o false")
+    return crear_reinversion(
+        **{campo: datos[campo] for campo in CAMPOS_REINVERSION},
+        automatica=datos.get("automatica", False)
+    )
+
+
+def leer_parametros(datos):
+    """Construir los argumentos de generar_flujo a partir de un objeto JSON"""
+    if not isinstance(datos, dict):
+        raise SolicitudInvalida("Los parámetros deben ser un objeto JSON")
+    desconocidos = set(datos) - set(PARAMETROS_POR_DEFECTO) - {
+        "ops_inicial", "reinversiones_compra", "reinversiones_colocacion"
+    }
+    if desconocidos:
+        raise SolicitudInvalida(f"Parámetros desconocidos: {', '.join(sorted(desconocidos))}")
+
+    parametros = dict(PARAMETROS_POR_DEFECTO)
+    parametros.update({k: v for k, v in datos.items() if k in PARAMETROS_POR_DEFECTO})
+    if parametros["meses_total"] < 1:
+        raise SolicitudInvalida("meses_total debe ser al menos 1")
+    # bool("no") es True: sin esta validación un texto activaría el modo exacto
+    if not isinstance(parametros["exacto"], bool):
+        raise SolicitudInvalida("'exacto' debe ser true o false")
+    curvas = parametros["curvas"]
+    if curvas is not None and not (
+        isinstance(curvas, dict) and all(isinstance(t, dict) for t in curvas.values()) and
+        all(isinstance(c, dict) for t in curvas.values() for c in t.values())
+    ):
+        raise SolicitudInvalida(
+            "'curvas' debe asociar plantillas con tramos y cada tramo con "
+            "listas 'no_cobro' y 'recupero'"
+        )
+    parametros["ops_inicial"] = datos.get(
+        "ops_inicial",
+        calcular_operaciones(parametros["inv_inicial"], parametros["costo_inicial"])
+    )
+    parametros["reinversiones_compra"] = [
+        _leer_reinversion(r) for r in datos.get("reinversiones_compra", [])
+    ]
+    parametros["reinversiones_colocacion"] = [
+        _leer_reinversion(r) for r in datos.get("reinversiones_colocacion", [])
+    ]
+    return parametros
+
+
+def _flujo_json(flujo_caja):
+    return {col: flujo_caja[col].tolist() for col in COLUMNAS_FLUJO}
+
+
+def calcular_flujo(datos):
+    """Endpoint /flujo"""
+    parametros = leer_parametros(datos)
+    return {"meses_total": parametros["meses_total"], "flujo": _flujo_json(generar_flujo(**parametros))}
+
+
+def calcular_kpis_escenario(datos):
+    """Endpoint /kpis"""
+    return calcular_kpis(generar_flujo(**leer_parametros(datos)))
+
+
+def calcular_kpis_escenarios_lote(escenarios):
+    """Endpoint /kpis en lote: todos los escenarios se reducen juntos"""
+    kpis = calcular_kpis_escenarios([leer_parametros(e) for e in escenarios])
+    kpis = kpis.astype(object).where(kpis.notna(), None)
+    return [{k: v.item() if hasattr(v, "item") else v for k, v in fila.items()}
+            for fila in kpis.to_dict("records")]
+
+
+def _reinversiones_automaticas(parametros, plantilla):
+    return calcular_reinversiones_automaticas(
+        parametros,
+        plantilla["inversion"],
+        plantilla["costo_op"],
+        plantilla["cuotas"],
+        plantilla["importe"],
+        plantilla["meses_sin_cobros"],
+        plantilla["cuotas_regulacion"],
+        plantilla["importe_regulacion"],
+        plantilla["pct_distribucion"],
+        plantilla["no_cobro"],
+        plantilla["meses_demora"],
+        piso_caja=plantilla["piso_caja"]
+    )
+
+
+def calcular_reinversion_automatica(datos):
+    """Endpoint /reinversion-automatica
+
+    Acepta los parámetros del flujo más un objeto opcional "colocacion" con la
+    plantilla de la reinversión automática.
+    """
+    if not isinstance(datos, dict):
+        raise SolicitudInvalida("Los parámetros deben ser un objeto JSON")
+    datos = dict(datos)
+    plantilla = dict(COLOCACION_POR_DEFECTO)
+    plantilla.update(datos.pop("colocacion", {}))
+
+    parametros = leer_parametros(datos)
+    REINVERSION_AUTOMATICA.incrementar()
+    with medir_tiempo(REINVERSION_AUTOMATICA_SEGUNDOS):
+        nuevas = _reinversiones_automaticas(parametros, plantilla)
+    REINVERSIONES_AUTOMATICAS_AGREGADAS.incrementar(len(nuevas))
+    parametros["reinversiones_colocacion"] = parametros["reinversiones_colocacion"] + nuevas
+    return {
+        "reinversiones_agregadas": nuevas,
+        "flujo": _flujo_json(generar_flujo(**parametros)),
+    }
+
+
+def calcular_estres(datos):
+    """Endpoint /estres
+
+    Acepta los parámetros del flujo más un objeto "estres" que asocia cada
+    nombre de escenario con su lista de shocks (ver fcf_engine.aplicar_estres).
+    """
+    if not isinstance(datos, dict):
+        raise SolicitudInvalida("Los parámetros deben ser un objeto JSON")
+    datos = dict(datos)
+    escenarios = datos.pop("estres", None)
+    if not isinstance(escenarios, dict) or not escenarios:
+        raise SolicitudInvalida("'estres' debe asociar nombres de escenario con listas de shocks")
+
+    flujos = generar_flujos_estres(leer_parametros(datos), escenarios)
+    return {nombre: _flujo_json(flujo) for nombre, flujo in flujos.items()}
+
+
+def calcular_contribuciones_json(datos):
+    """Endpoint /contribuciones
+
+    Devuelve la matriz CSR completa; con "mes" agrega las "top" (10 por
+    defecto) cohortes que más aportan a ese mes.
+    """
+    if not isinstance(datos, dict):
+        raise SolicitudInvalida("Los parámetros deben ser un objeto JSON")
+    datos = dict(datos)
+    mes = datos.pop("mes", None)
+    top = datos.pop("top", 10)
+
+    contribuciones = calcular_contribuciones(leer_parametros(datos))
+    respuesta = {
+        "forma": list(contribuciones["forma"]),
+        "indptr": contribuciones["indptr"].tolist(),
+        "indices": contribuciones["indices"].tolist(),
+        "ingresos": contribuciones["ingresos"].tolist(),
+        "no_cobro": contribuciones["no_cobro"].tolist(),
+        "cohortes": contribuciones["cohortes"].to_dict("records"),
+    }
+    if mes is not None:
+        respuesta["top_mes"] = (
+            top_contribuciones_mes(contribuciones, mes, top)
+            .reset_index(names="Cohorte")
+            .to_dict("records")
+        )
+    return respuesta
+
+
+ENDPOINTS = {
+    "/flujo": calcular_flujo,
+    "/kpis": calcular_kpis_escenario,
+    "/reinversion-automatica": calcular_reinversion_automatica,
+    "/estres": calcular_estres,
+    "/contribuciones": calcular_contribuciones_json,
+}
+
+# Endpoints con una versión vectorizada para lotes; el resto procesa los
+# escenarios de a uno
+ENDPOINTS_LOTE = {
+    "/kpis": calcular_kpis_escenarios_lote,
+}
+
+
+class ManejadorFlujo(BaseHTTPRequestHandler):
+    """Atiende las solicitudes JSON; cada conexión corre en su propio hilo"""
+
+    protocol_version = "HTTP/1.1"
+
+    def _responder(self, estado, cuerpo, tipo="application/json; charset=utf-8"):
+        if isinstance(cuerpo, str):
+            datos = cuerpo.encode("utf-8")
+        else:
+            datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(datos)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        if self.path == "/salud":
+            self._responder(200, {
+                "estado": "ok",
+                "endpoints": sorted(ENDPOINTS),
+                "backend": backend_activo(),
+            })
+        elif self.path == "/metrics":
+            self._responder(200, REGISTRO.texto(), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._responder(404, {"error": f"Ruta no encontrada: {self.path}"})
+
+    def _leer_cuerpo(self):
+        """Leer el cuerpo completo de la solicitud.
+
+        Se lee siempre, antes de responder: con keep-alive un cuerpo sin leer
+        se tomaría como la siguiente solicitud. Si Content-Length es inválido
+        no se puede saber dónde termina, así que se cierra la conexión y se
+        devuelve None.
+        """
+        try:
+            largo = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            largo = -1
+        if largo < 0:
+            self.close_connection = True
+            return None
+        return self.rfile.read(largo)
+
+    def do_POST(self):
+        cuerpo = self._leer_cuerpo()
+        endpoint = ENDPOINTS.get(self.path)
+        if endpoint is None:
+            self._responder(404, {"error": f"Ruta no encontrada: {self.path}"})
+            return
+
+        inicio = time.perf_counter()
+        if cuerpo is None:
+            estado, respuesta = 400, {"error": "Content-Length inválido"}
+        else:
+            estado, respuesta = self._atender(endpoint, cuerpo)
+        # Registrar antes de responder, para que el cliente ya vea la solicitud en /metrics
+        API_SOLICITUDES.incrementar(endpoint=self.path, estado=estado)
+        API_SEGUNDOS.observar(time.perf_counter() - inicio, endpoint=self.path)
+        self._responder(estado, respuesta)
+
+    def _atender(self, endpoint, cuerpo):
+        """Procesar el cuerpo JSON y devolver (estado, respuesta)"""
+        try:
+            datos = json.loads(cuerpo or b"{}")
+            if isinstance(datos, dict) and "escenarios" in datos:
+                if not isinstance(datos["escenarios"], list):
+                    raise SolicitudInvalida("'escenarios' debe ser una lista")
+                if self.path in ENDPOINTS_LOTE:
+                    resultados = ENDPOINTS_LOTE[self.path](datos["escenarios"])
+                else:
+                    resultados = [endpoint(e) for e in datos["escenarios"]]
+                return 200, {"resultados": resultados}
+            return 200, endpoint(datos)
+        except json.JSONDecodeError as e:
+            return 400, {"error": f"JSON inválido: {e}"}
+        except (SolicitudInvalida, KeyError, TypeError, ValueError) as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            # Un error inesperado igual recibe respuesta y queda en las métricas;
+            # el detalle se registra aunque el servidor sea silencioso
+            BaseHTTPRequestHandler.log_message(
+                self, "Error interno en %s:\n%s", self.path, traceback.format_exc()
+            )
+            return 500, {"error": f"Error interno: {type(e).__name__}: {e}"}
+
+    def log_message(self, format, *args):
+        if not self.server.silencioso:
+            super().log_message(format, *args)
+
+
+def crear_servidor(host="127.0.0.1", puerto=8502, silencioso=False):
+    """Crear el servidor y calentar el motor antes de aceptar solicitudes"""
+    # Un primer cálculo paga la inicialización de pandas/numpy (y la
+    # compilación de los núcleos numba, si están activos) una sola vez. Se
+    # llama al motor directamente para no contar el calentamiento en las
+    # métricas de los endpoints (el histograma del motor sí lo registra)
+    parametros = leer_parametros({"meses_total": 2})
+    generar_flujo(**parametros)
+    _reinversiones_automaticas(parametros, COLOCACION_POR_DEFECTO)
+
+    servidor = ThreadingHTTPServer((host, puerto), ManejadorFlujo)
+    servidor.daemon_threads = True
+    servidor.silencioso = silencioso
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API JSON del motor de flujo de caja")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8502)
+    parser.add_argument("--silencioso", action="store_true", help="No registrar cada solicitud")
+    args = parser.parse_args()
+
+    servidor = crear_servidor(args.host, args.puerto, args.silencioso)
+    print(f"API de flujo de caja escuchando en http://{args.host}:{servidor.server_port} "
+          f"(backend {backend_activo()})")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Verificación de la API JSON contra un servidor local.
+
+Uso:
+    python fcf_api_verificacion.py
+
+Levanta fcf_api en 127.0.0.1 con un puerto libre y recorre todos los
+endpoints sobre una misma conexión keep-alive: formas simples y en lote,
+errores 400 y 404, y que la conexión siga sirviendo después de cada error.
+No necesita red. Devuelve 1 si alguna verificación falla.
+"""
+import argparse
+import http.client
+import json
+import threading
+
+from fcf_api import crear_servidor
+
+_SHOCK_MORA = {"tipo": "no_cobro", "desde": 0, "valor": 10}
+
+
+def _lista_de(n):
+    return lambda r: isinstance(r.get("resultados"), list) and len(r["resultados"]) == n
+
+
+# (descripción, método, ruta, cuerpo, estado esperado, verificación de la respuesta)
+CASOS = [
+    ("salud", "GET", "/salud", None, 200, lambda r: r["estado"] == "ok" and "backend" in r),
+    ("flujo", "POST", "/flujo", {"meses_total": 24}, 200, lambda r: len(r["flujo"]["Ingresos"]) == 24),
+    ("flujo exacto", "POST", "/flujo", {"meses_total": 24, "exacto": True}, 200,
+     lambda r: all(isinstance(v, int) for v in r["flujo"]["Saldo Acumulado"])),
+    ("flujo en lote", "POST", "/flujo", {"escenarios": [{"meses_total": 12}, {"meses_total": 36}]}, 200,
+     _lista_de(2)),
+    ("kpis", "POST", "/kpis", {}, 200, lambda r: "mes_equilibrio" in r),
+    ("kpis en lote", "POST", "/kpis", {"escenarios": [{}, {"exacto": True}, {"meses_total": 12}]}, 200,
+     lambda r: _lista_de(3)(r) and isinstance(r["resultados"][1]["saldo_final"], int)),
+    ("kpis lote vacío", "POST", "/kpis", {"escenarios": []}, 200, _lista_de(0)),
+    ("reinversión automática", "POST", "/reinversion-automatica", {"meses_total": 12}, 200,
+     lambda r: isinstance(r["reinversiones_agregadas"], list) and len(r["flujo"]["Ingresos"]) == 12),
+    ("estrés", "POST", "/estres", {"meses_total": 24, "estres": {"Base": [], "Mora": [_SHOCK_MORA]}}, 200,
+     lambda r: sum(r["Mora"]["No Cobro"]) > sum(r["Base"]["No Cobro"])),
+    ("contribuciones", "POST", "/contribuciones", {"meses_total": 24, "mes": 3}, 200,
+     lambda r: r["forma"] == [1, 24] and len(r["top_mes"]) == 1),
+    ("JSON inválido", "POST", "/flujo", b"{no es json", 400, None),
+    ("parámetro desconocido", "POST", "/flujo", {"meses": 12}, 400, None),
+    ("exacto no booleano", "POST", "/flujo", {"exacto": "no"}, 400, None),
+    ("shock inválido", "POST", "/estres", {"estres": {"A": [{"tipo": "demora", "desde": 0, "valor": -1}]}}, 400,
+     None),
+    ("lote mal formado", "POST", "/kpis", {"escenarios": {}}, 400, None),
+    ("ruta POST inexistente", "POST", "/nada", {"meses_total": 12}, 404, None),
+    ("ruta GET inexistente", "GET", "/nada", None, 404, None),
+    ("flujo tras un 404 con cuerpo", "POST", "/flujo", {"meses_total": 12}, 200,
+     lambda r: len(r["flujo"]["Ingresos"]) == 12),
+    ("métricas", "GET", "/metrics", None, 200,
+     lambda r: 'fcf_api_solicitudes_total{endpoint="/nada"' not in r and "fcf_api_solicitudes_total" in r
+     and "fcf_reinversion_automatica_total 1\n" in r and 'calculo="flujo"' in r),
+]
+
+
+def _solicitar(conexion, metodo, ruta, cuerpo, encabezados=None):
+    if cuerpo is not None and not isinstance(cuerpo, bytes):
+        cuerpo = json.dumps(cuerpo).encode("utf-8")
+    encabezados = dict(encabezados or {})
+    if cuerpo is not None:
+        encabezados["Content-Type"] = "application/json"
+    conexion.request(metodo, ruta, body=cuerpo, headers=encabezados)
+    respuesta = conexion.getresponse()
+    datos = respuesta.read().decode("utf-8")
+    if respuesta.getheader("Content-Type", "").startswith("application/json"):
+        datos = json.loads(datos)
+    return respuesta, datos
+
+
+def verificar(servidor):
+    """Correr CASOS sobre una sola conexión y devolver la lista de fallas"""
+    host, puerto = servidor.server_address[:2]
+    fallas = []
+    conexion = http.client.HTTPConnection(host, puerto, timeout=60)
+    conexion.connect()
+    socket_inicial = conexion.sock
+
+    for descripcion, metodo, ruta, cuerpo, esperado, verificacion in CASOS:
+        try:
+            respuesta, datos = _solicitar(conexion, metodo, ruta, cuerpo)
+        except (OSError, http.client.HTTPException) as e:
+            fallas.append(f"{descripcion}: {type(e).__name__}: {e}")
+            conexion.close()
+            continue
+        if respuesta.status != esperado:
+            fallas.append(f"{descripcion}: estado {respuesta.status}, se esperaba {esperado}: {datos}")
+        elif verificacion is not None and not verificacion(datos):
+            fallas.append(f"{descripcion}: respuesta inesperada")
+        print(f"  {metodo:<5}{ruta:<25}{respuesta.status}  {descripcion}")
+
+    if conexion.sock is not socket_inicial:
+        fallas.append("keep-alive: la conexión se reabrió entre solicitudes")
+    else:
+        print(f"  {len(CASOS)} solicitudes sobre una sola conexión keep-alive")
+
+    # Sin un Content-Length válido no se sabe dónde termina el cuerpo: 400 y cierre
+    respuesta, _ = _solicitar(conexion, "POST", "/flujo", None, {"Content-Length": "x"})
+    if respuesta.status != 400 or respuesta.getheader("Connection") != "close":
+        fallas.append(f"Content-Length inválido: estado {respuesta.status}, "
+                      f"Connection {respuesta.getheader('Connection')!r}")
+    else:
+        print("  POST /flujo con Content-Length inválido: 400 y cierre de la conexión")
+    conexion.close()
+    return fallas
+
+
+def main():
+    argparse.ArgumentParser(description="Verificación de la API JSON contra un servidor local").parse_args()
+
+    servidor = crear_servidor(puerto=0, silencioso=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    print(f"API en http://127.0.0.1:{servidor.server_port}")
+    try:
+        fallas = verificar(servidor)
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+    for falla in fallas:
+        print(f"Falla: {falla}")
+    print("Sin fallas" if not fallas else f"{len(fallas)} fallas")
+    return 1 if fallas else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
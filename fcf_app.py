@@ -1,6 +1,37 @@
+import importlib
+import logging
+import numbers
+import os
+import threading
+
 import streamlit as st
-import pandas as pd
-import numpy as np
+
+# pandas y las funciones opcionales (curvas, contribuciones, estrés) se
+# importan en las ramas que las usan: la primera carga sin reinversiones no
+# las necesita
+from fcf_engine import (
+    COLUMNAS_FLUJO,
+    TIPOS_COHORTE,
+    calcular_kpis,
+    calcular_operaciones,
+    calcular_reinversiones_automaticas,
+    crear_reinversion,
+    generar_flujo,
+)
+from fcf_kernels import backend_activo
+from fcf_metricas import (
+    REINVERSION_AUTOMATICA,
+    REINVERSION_AUTOMATICA_SEGUNDOS,
+    REINVERSIONES_AUTOMATICAS_AGREGADAS,
+    RERUNS,
+    iniciar_exportador,
+    medir_tiempo,
+    registrar_sesion,
+)
+
+# Métricas de operación (ver fcf_metricas; la exportación se inicia una vez por proceso)
+iniciar_exportador()
+RERUNS.incrementar()
 
 # Configuración de la página
 st.set_page_config(
@@ -9,6 +40,23 @@ st.set_page_config(
     layout="wide"
 )
 
+# Resolver el backend de los núcleos una vez por proceso, al arrancar: un
+# FCF_BACKEND=numba sin numba instalado se informa aquí en lugar de fallar al
+# usar la reinversión automática
+@st.cache_resource(show_spinner=False)
+def resolver_backend():
+    try:
+        backend = backend_activo()
+    except (ImportError, ValueError) as e:
+        logging.getLogger(__name__).error("Backend de los núcleos no disponible: %s", e)
+        return None, str(e)
+    logging.getLogger(__name__).info("Backend de los núcleos: %s", backend)
+    return backend, None
+
+backend_nucleos, error_backend = resolver_backend()
+if error_backend:
+    st.error(f"{error_backend}. La reinversión automática queda deshabilitada hasta corregir FCF_BACKEND.")
+
 # Agregar CSS personalizado para las líneas divisorias y alineación
 st.markdown("""
 <style>
@@ -89,18 +137,36 @@ st.markdown("""
 
 # Función para formatear números en PYG sin decimales
 def formatear_pyg(valor):
-    if isinstance(valor, (int, float)):
-        return f'Gs. {int(valor):,}'.replace(',', '.')
+    if isinstance(valor, numbers.Real):
+        return f'Gs. {round(valor):,}'.replace(',', '.')
     return valor
 
-def calcular_operaciones(inversion, costo_op):
-    """Calcular número de operaciones basadas en inversión y costo"""
-    try:
-        if costo_op > 0:
-            return max(1, inversion // costo_op)
-        return 0
-    except:
-        return 0
+# Tipos de shock de estrés: etiqueta en pantalla -> tipo del motor
+TIPOS_SHOCK_ETIQUETAS = {
+    "No Cobro (+ puntos)": "no_cobro",
+    "Demora (meses)": "demora",
+    "% Distribución Regulación": "pct_distribucion",
+}
+
+# Escenarios de estrés de ejemplo
+SHOCKS_EJEMPLO = [
+    {"Escenario": "Mora +15", "Tipo": "No Cobro (+ puntos)", "Desde": 18, "Hasta": None, "Valor": 15.0, "Aplica a": "Todas"},
+    {"Escenario": "Demora 3 meses", "Tipo": "Demora (meses)", "Desde": 24, "Hasta": None, "Valor": 3.0, "Aplica a": "Todas"},
+    {"Escenario": "Regulación 20%", "Tipo": "% Distribución Regulación", "Desde": 0, "Hasta": None, "Valor": 20.0, "Aplica a": "Todas"},
+]
+
+# Nombres en pantalla de los KPIs del motor
+ETIQUETAS_KPI = {
+    "mes_equilibrio": "Mes Equilibrio",
+    "saldo_minimo": "Saldo Mínimo",
+    "mes_saldo_minimo": "Mes Saldo Mínimo",
+    "saldo_final": "Saldo Final",
+    "max_operaciones_abiertas": "Pico Operaciones Abiertas",
+    "mes_max_operaciones": "Mes Pico Operaciones",
+    "total_ingresos": "Total Ingresos",
+    "total_no_cobro": "Total No Cobro",
+}
+KPIS_MONETARIOS = ["saldo_minimo", "saldo_final", "total_ingresos", "total_no_cobro"]
 
 # Crear listas para almacenar reinversiones (mantener estado en st.session_state)
 if 'reinversiones_compra' not in st.session_state:
@@ -109,133 +175,20 @@ if 'reinversiones_compra' not in st.session_state:
 if 'reinversiones_colocacion' not in st.session_state:
     st.session_state.reinversiones_colocacion = []
 
-# Función para generar flujo de caja
-def generar_flujo(
-    inv_inicial, 
-    costo_inicial, 
-    cuotas_inicial, 
-    importe_inicial, 
-    meses_sin_cobros_inicial,
-    cuotas_regulacion_inicial,
-    importe_regulacion_inicial,
-    pct_distribucion_inicial,
-    no_cobro_inicial, 
-    ops_inicial, 
-    meses_demora_inicial,
-    reinversiones_compra,
-    reinversiones_colocacion,
-    pago_mensual,
-    meses_pago,
-    meses_total
-):
-    """Generar el flujo de caja basado en parámetros de entrada"""
-    # Crear dataframe para el flujo de caja
-    flujo_caja = pd.DataFrame(
-        np.zeros((meses_total, 10)),
-        columns=["Ingresos", "Reinversión", "Pago Mensual", "Total Cobrado", "Saldo Acumulado", "Total Disponible", "No Cobro", "Operaciones Abiertas", "Reinversiones Automáticas Mes", "Reinversiones Automáticas Total"]
-    )
-    
-    # Aplicar inversión inicial
-    flujo_caja.loc[0, "Saldo Acumulado"] = -inv_inicial
-    
-    # Aplicar pago mensual solo durante los meses especificados
-    for mes in range(1, min(meses_pago + 1, meses_total)):
-        flujo_caja.loc[mes, "Pago Mensual"] = pago_mensual
-    
-    # Procesar ingresos de inversión inicial con retraso
-    for i in range(min(cuotas_inicial, meses_total - 1)):
-        mes = i + 1 + meses_demora_inicial
-        if mes < meses_total:
-            ingreso_real = ops_inicial * (importe_inicial * (1 - no_cobro_inicial / 100))
-            flujo_caja.loc[mes, "Ingresos"] += ingreso_real
-            flujo_caja.loc[mes, "No Cobro"] += ops_inicial * (importe_inicial * (no_cobro_inicial / 100))
-            flujo_caja.loc[mes, "Operaciones Abiertas"] += ops_inicial
-    
-    # Procesar cuotas de regulación inicial
-    # Calcular mes de inicio para las cuotas de regulación (después de las cuotas iniciales + meses sin cobros)
-    mes_inicio_regulacion = meses_demora_inicial + cuotas_inicial + meses_sin_cobros_inicial
-    
-    for i in range(min(cuotas_regulacion_inicial, meses_total - mes_inicio_regulacion)):
-        mes = mes_inicio_regulacion + i
-        if mes < meses_total:
-            # Aplicar el porcentaje de distribución al importe de la regulación
-            importe_ajustado = importe_regulacion_inicial * (pct_distribucion_inicial / 100)
-            ingreso_real = ops_inicial * (importe_ajustado * (1 - no_cobro_inicial / 100))
-            flujo_caja.loc[mes, "Ingresos"] += ingreso_real
-            flujo_caja.loc[mes, "No Cobro"] += ops_inicial * (importe_ajustado * (no_cobro_inicial / 100))
-            # No incrementamos operaciones abiertas aquí porque son las mismas operaciones iniciales
-    
-    # Procesar reinversiones
-    for reinv_list in [reinversiones_compra, reinversiones_colocacion]:
-        for reinv in reinv_list:
-            mes_inversion = min(reinv["mes"], meses_total - 1)
-            flujo_caja.loc[mes_inversion, "Reinversión"] += reinv["inversion"]
-            
-            # Incrementar contador de reinversiones automáticas si corresponde
-            if reinv.get("automatica", False) and reinv_list == reinversiones_colocacion:
-                flujo_caja.loc[mes_inversion, "Reinversiones Automáticas Mes"] += 1
-            
-            # Procesar ingresos normales de las reinversiones
-            for i in range(min(reinv["cuotas"], meses_total - reinv["mes"] - reinv["meses_demora"])):
-                mes = reinv["mes"] + i + reinv["meses_demora"]
-                if mes < meses_total:
-                    ingreso_real = reinv["ops"] * (reinv["importe"] * (1 - reinv["no_cobro"] / 100))
-                    flujo_caja.loc[mes, "Ingresos"] += ingreso_real
-                    flujo_caja.loc[mes, "No Cobro"] += reinv["ops"] * (reinv["importe"] * (reinv["no_cobro"] / 100))
-                    flujo_caja.loc[mes, "Operaciones Abiertas"] += reinv["ops"]
-            
-            # Procesar cuotas de regulación de las reinversiones
-            mes_inicio_regulacion_reinv = reinv["mes"] + reinv["meses_demora"] + reinv["cuotas"] + reinv["meses_sin_cobros"]
-            
-            for i in range(min(reinv["cuotas_regulacion"], meses_total - mes_inicio_regulacion_reinv)):
-                mes = mes_inicio_regulacion_reinv + i
-                if mes < meses_total:
-                    # Aplicar el porcentaje de distribución al importe de la regulación
-                    importe_ajustado = reinv["importe_regulacion"] * (reinv["pct_distribucion"] / 100)
-                    ingreso_real = reinv["ops"] * (importe_ajustado * (1 - reinv["no_cobro"] / 100))
-                    flujo_caja.loc[mes, "Ingresos"] += ingreso_real
-                    flujo_caja.loc[mes, "No Cobro"] += reinv["ops"] * (importe_ajustado * (reinv["no_cobro"] / 100))
-                    # No incrementamos operaciones abiertas aquí porque son las mismas operaciones de la reinversión
-    
-    # Calcular totales acumulados
-    flujo_caja["Total Cobrado"] = flujo_caja["Ingresos"].cumsum()
-    
-    # Calcular Saldo Acumulado considerando pago mensual
-    flujo_caja["Saldo Acumulado"] = (
-        flujo_caja.loc[0, "Saldo Acumulado"] + 
-        flujo_caja["Ingresos"].cumsum() - 
-        flujo_caja["Reinversión"].cumsum() -
-        flujo_caja["Pago Mensual"].cumsum()
-    )
-    
-    flujo_caja["Total Disponible"] = flujo_caja["Ingresos"].cumsum() - flujo_caja["Reinversión"].cumsum() - flujo_caja["Pago Mensual"].cumsum()
-    
-    # Calcular totales acumulados de reinversiones automáticas
-    reinv_auto_acumuladas = 0
-    for i in range(meses_total):
-        reinv_auto_acumuladas += flujo_caja.loc[i, "Reinversiones Automáticas Mes"]
-        flujo_caja.loc[i, "Reinversiones Automáticas Total"] = reinv_auto_acumuladas
-    
-    return flujo_caja
+# Curvas de mora por antigüedad cargadas desde CSV (None = % No Cobro plano)
+if 'curvas_mora' not in st.session_state:
+    st.session_state.curvas_mora = None
+    st.session_state.curvas_mora_archivo = None
 
 # Función para agregar reinversión
 def agregar_reinversion(tipo_reinversion, mes, inversion, cuotas, importe, 
                         meses_sin_cobros, cuotas_regulacion, importe_regulacion, 
                         pct_distribucion, no_cobro, ops, meses_demora, automatica=False):
-    nueva_reinversion = {
-        "mes": mes,
-        "inversion": inversion,
-        "cuotas": cuotas,
-        "importe": importe,
-        "meses_sin_cobros": meses_sin_cobros,
-        "cuotas_regulacion": cuotas_regulacion,
-        "importe_regulacion": importe_regulacion,
-        "pct_distribucion": pct_distribucion,
-        "no_cobro": no_cobro,
-        "ops": ops,
-        "meses_demora": meses_demora,
-        "automatica": automatica
-    }
+    nueva_reinversion = crear_reinversion(
+        mes, inversion, cuotas, importe, meses_sin_cobros, cuotas_regulacion,
+        importe_regulacion, pct_distribucion, no_cobro, ops, meses_demora,
+        automatica=automatica
+    )
     
     if tipo_reinversion == "Compra":
         st.session_state.reinversiones_compra.append(nueva_reinversion)
@@ -244,23 +197,9 @@ def agregar_reinversion(tipo_reinversion, mes, inversion, cuotas, importe,
     
     return True
 
-# Función para ejecutar reinversiones automáticas
-def ejecutar_reinversion_automatica(
-    inversion_colocacion, 
-    costo_op_colocacion, 
-    cuotas_colocacion, 
-    importe_colocacion, 
-    meses_sin_cobros_colocacion, 
-    cuotas_regulacion_colocacion, 
-    importe_regulacion_colocacion, 
-    pct_distribucion_colocacion, 
-    no_cobro_colocacion, 
-    meses_demora_colocacion,
-    meses_pago,
-    meses_total
-):
-    # Generar un flujo de caja temporal con las reinversiones actuales
-    flujo_temp = generar_flujo(
+# Parámetros de generar_flujo tomados de las entradas actuales
+def parametros_flujo(meses_pago, meses_total):
+    return dict(
         inv_inicial=inv_inicial,
         costo_inicial=costo_inicial,
         cuotas_inicial=cuotas_inicial,
@@ -276,72 +215,47 @@ def ejecutar_reinversion_automatica(
         reinversiones_colocacion=st.session_state.reinversiones_colocacion,
         pago_mensual=pago_mensual,
         meses_pago=meses_pago,
-        meses_total=meses_total
+        meses_total=meses_total,
+        exacto=modo_exacto,
+        curvas=st.session_state.curvas_mora
     )
-    
-    # Costo por reinversión y operaciones que se generan
-    ops_por_reinversion = calcular_operaciones(inversion_colocacion, costo_op_colocacion)
-    
-    # Contador de reinversiones automáticas
-    reinversiones_agregadas = 0
-    
-    # Recorrer todos los meses para ver dónde hay fondos disponibles
-    for mes in range(1, meses_total):  # Empezar desde el mes 1
-        # Convertir el valor a número
-        disponible = flujo_temp.loc[mes, "Total Disponible"]
-        if isinstance(disponible, str):
-            disponible = float(disponible.replace('Gs. ', '').replace('.', ''))
-        
-        # Verificar si hay suficiente para al menos una reinversión
-        while disponible >= inversion_colocacion:
-            # Agregar una reinversión automática para este mes
-            agregar_reinversion(
-                "Colocacion",
-                mes,  # Mes actual
-                inversion_colocacion,
-                cuotas_colocacion,
-                importe_colocacion,
-                meses_sin_cobros_colocacion,
-                cuotas_regulacion_colocacion,
-                importe_regulacion_colocacion,
-                pct_distribucion_colocacion,
-                no_cobro_colocacion,
-                ops_por_reinversion,
-                meses_demora_colocacion,
-                automatica=True  # Marcar como automática
-            )
-            
-            reinversiones_agregadas += 1
-            
-            # Actualizar el disponible restando la inversión
-            disponible -= inversion_colocacion
-            
-            # Regenerar el flujo temporal para la próxima iteración
-            flujo_temp = generar_flujo(
-                inv_inicial=inv_inicial,
-                costo_inicial=costo_inicial,
-                cuotas_inicial=cuotas_inicial,
-                importe_inicial=importe_inicial,
-                meses_sin_cobros_inicial=meses_sin_cobros_inicial,
-                cuotas_regulacion_inicial=cuotas_regulacion_inicial,
-                importe_regulacion_inicial=importe_regulacion_inicial,
-                pct_distribucion_inicial=pct_distribucion_inicial,
-                no_cobro_inicial=no_cobro_inicial,
-                ops_inicial=ops_inicial,
-                meses_demora_inicial=meses_demora_inicial,
-                reinversiones_compra=st.session_state.reinversiones_compra,
-                reinversiones_colocacion=st.session_state.reinversiones_colocacion,
-                pago_mensual=pago_mensual,
-                meses_pago=meses_pago,
-                meses_total=meses_total
-            )
-            
-            # Actualizar el disponible después de recalcular el flujo
-            disponible = flujo_temp.loc[mes, "Total Disponible"]
-            if isinstance(disponible, str):
-                disponible = float(disponible.replace('Gs. ', '').replace('.', ''))
-    
-    return reinversiones_agregadas
+
+# Función para ejecutar reinversiones automáticas
+def ejecutar_reinversion_automatica(
+    inversion_colocacion, 
+    costo_op_colocacion, 
+    cuotas_colocacion, 
+    importe_colocacion, 
+    meses_sin_cobros_colocacion, 
+    cuotas_regulacion_colocacion, 
+    importe_regulacion_colocacion, 
+    pct_distribucion_colocacion, 
+    no_cobro_colocacion, 
+    meses_demora_colocacion,
+    meses_pago,
+    meses_total,
+    piso_caja=0
+):
+    REINVERSION_AUTOMATICA.incrementar()
+    with medir_tiempo(REINVERSION_AUTOMATICA_SEGUNDOS):
+        nuevas = calcular_reinversiones_automaticas(
+            parametros_flujo(meses_pago, meses_total),
+            inversion_colocacion,
+            costo_op_colocacion,
+            cuotas_colocacion,
+            importe_colocacion,
+            meses_sin_cobros_colocacion,
+            cuotas_regulacion_colocacion,
+            importe_regulacion_colocacion,
+            pct_distribucion_colocacion,
+            no_cobro_colocacion,
+            meses_demora_colocacion,
+            piso_caja=piso_caja
+        )
+    st.session_state.reinversiones_colocacion.extend(nuevas)
+    REINVERSIONES_AUTOMATICAS_AGREGADAS.incrementar(len(nuevas))
+    
+    return len(nuevas)
 
 # Función para resetear datos
 def reset_all():
@@ -395,6 +309,13 @@ with header_col2:
         help="Número total de meses a incluir en el flujo de caja"
     )
     
+    modo_exacto = st.checkbox(
+        "Modo exacto (Gs. enteros)",
+        value=False,
+        key="modo_exacto",
+        help="Calcula en guaraníes enteros y reparte el redondeo para que Ingresos + No Cobro cuadren con el importe bruto"
+    )
+    
     st.markdown("<br>", unsafe_allow_html=True)  # Espacio para alinear con el título
     st.markdown('<div class="boton-accion">', unsafe_allow_html=True)
     reset_todo_superior = st.button("🔄 RESET TODO", type="primary", key="reset_todo_superior", 
@@ -781,6 +702,15 @@ with col_colocacion:
         help="Tiempo que transcurre desde la inversión hasta recibir el primer pago"
     )
     
+    piso_caja = st.number_input(
+        "Piso de Caja (Reinversión Automática):", 
+        min_value=0, 
+        value=0, 
+        step=1000000,
+        key="piso_caja",
+        help="Total Disponible mínimo que debe quedar en el mes después de cada reinversión automática"
+    )
+    
     col1, col2, col3 = st.columns(3)
     with col1:
         st.markdown('<div class="boton-accion">', unsafe_allow_html=True)
@@ -805,27 +735,36 @@ with col_colocacion:
     
     with col2:
         st.markdown('<div class="boton-accion boton-reinversion-auto">', unsafe_allow_html=True)
-        reinversion_auto = st.button("Reinversión Automática")
+        reinversion_auto = st.button(
+            "Reinversión Automática",
+            disabled=backend_nucleos is None,
+            help=f"Núcleos: {backend_nucleos}" if backend_nucleos else error_backend
+        )
         if reinversion_auto:
             # Ejecutar la reinversión automática
-            reinversiones_agregadas = ejecutar_reinversion_automatica(
-                inversion_colocacion,
-                costo_op_colocacion,
-                cuotas_colocacion,
-                importe_colocacion,
-                meses_sin_cobros_colocacion,
-                cuotas_regulacion_colocacion,
-                importe_regulacion_colocacion,
-                pct_distribucion_colocacion,
-                no_cobro_colocacion,
-                meses_demora_colocacion,
-                meses_pago,
-                meses_total
-            )
-            if reinversiones_agregadas > 0:
-                st.success(f"Se agregaron {reinversiones_agregadas} reinversiones automáticas")
+            try:
+                reinversiones_agregadas = ejecutar_reinversion_automatica(
+                    inversion_colocacion,
+                    costo_op_colocacion,
+                    cuotas_colocacion,
+                    importe_colocacion,
+                    meses_sin_cobros_colocacion,
+                    cuotas_regulacion_colocacion,
+                    importe_regulacion_colocacion,
+                    pct_distribucion_colocacion,
+                    no_cobro_colocacion,
+                    meses_demora_colocacion,
+                    meses_pago,
+                    meses_total,
+                    piso_caja
+                )
+            except ValueError as e:
+                st.error(str(e))
             else:
-                st.warning("No hay fondos suficientes para hacer reinversiones automáticas")
+                if reinversiones_agregadas > 0:
+                    st.success(f"Se agregaron {reinversiones_agregadas} reinversiones automáticas")
+                else:
+                    st.warning("No hay fondos suficientes para hacer reinversiones automáticas")
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col3:
@@ -836,9 +775,47 @@ with col_colocacion:
             st.success("Reinversiones Colocación reiniciadas")
         st.markdown('</div>', unsafe_allow_html=True)
 
+# ---- Curvas de mora por antigüedad ----
+with st.expander("Curvas de Mora por Antigüedad", expanded=st.session_state.curvas_mora is not None):
+    st.write(
+        "CSV de cosechas observadas con columnas plantilla (Inicial, Compra, Colocación), "
+        "tramo (cuotas, regulacion), cuota, bruto, no_cobrado y recuperado (opcional). "
+        "Los tramos con curva reemplazan el % No Cobro de su sección según el número de cuota."
+    )
+    archivo_curvas = st.file_uploader("CSV de cosechas", type="csv", key="csv_curvas")
+    if archivo_curvas is None:
+        st.session_state.curvas_mora = None
+        st.session_state.curvas_mora_archivo = None
+    elif archivo_curvas.file_id != st.session_state.curvas_mora_archivo:
+        from fcf_engine import cargar_curvas_csv
+        try:
+            st.session_state.curvas_mora = cargar_curvas_csv(archivo_curvas)
+        except (ValueError, KeyError) as e:
+            st.session_state.curvas_mora = None
+            st.error(f"No se pudieron cargar las curvas: {e}")
+        st.session_state.curvas_mora_archivo = archivo_curvas.file_id
+    
+    if st.session_state.curvas_mora:
+        import pandas as pd
+        
+        # % No Cobro efectivo (descontado el recupero) por número de cuota
+        curvas_efectivas = pd.DataFrame({
+            f"{plantilla} - {tramo}": pd.Series(
+                [nc * (1 - rec / 100) for nc, rec in zip(curva["no_cobro"], curva["recupero"])],
+                index=range(1, len(curva["no_cobro"]) + 1)
+            )
+            for plantilla, tramos in st.session_state.curvas_mora.items()
+            for tramo, curva in tramos.items()
+        })
+        st.line_chart(curvas_efectivas, x_label="Cuota", y_label="% No Cobro efectivo")
+
+# Tamaño de las listas de reinversiones de esta sesión
+registrar_sesion(st.session_state.reinversiones_compra, st.session_state.reinversiones_colocacion)
+
 # Generar y mostrar el flujo de caja
 if ejecutar_inversion or agregar_compra or agregar_colocacion or reinversion_auto or st.session_state.reinversiones_compra or st.session_state.reinversiones_colocacion:
     st.header("Flujo de Caja")
+    import pandas as pd
     
     # Resumen de reinversiones si hay alguna
     if st.session_state.reinversiones_compra or st.session_state.reinversiones_colocacion:
@@ -855,31 +832,34 @@ if ejecutar_inversion or agregar_compra or agregar_colocacion or reinversion_aut
             st.write(f"Reinversiones Colocación: {len(st.session_state.reinversiones_colocacion)} (Manuales: {reinv_manuales}, Automáticas: {reinv_automaticas})")
     
     # Generar flujo de caja
-    flujo_caja = generar_flujo(
-        inv_inicial=inv_inicial,
-        costo_inicial=costo_inicial,
-        cuotas_inicial=cuotas_inicial,
-        importe_inicial=importe_inicial,
-        meses_sin_cobros_inicial=meses_sin_cobros_inicial,
-        cuotas_regulacion_inicial=cuotas_regulacion_inicial,
-        importe_regulacion_inicial=importe_regulacion_inicial,
-        pct_distribucion_inicial=pct_distribucion_inicial,
-        no_cobro_inicial=no_cobro_inicial,
-        ops_inicial=ops_inicial,
-        meses_demora_inicial=meses_demora_inicial,
-        reinversiones_compra=st.session_state.reinversiones_compra,
-        reinversiones_colocacion=st.session_state.reinversiones_colocacion,
-        pago_mensual=pago_mensual,
-        meses_pago=meses_pago,
-        meses_total=meses_total
-    )
+    parametros_actuales = parametros_flujo(meses_pago, meses_total)
+    flujo_caja = generar_flujo(**parametros_actuales)
+    
+    # Indicadores principales
+    kpis = calcular_kpis(flujo_caja)
+    kpi_col1, kpi_col2, kpi_col3, kpi_col4, kpi_col5 = st.columns(5)
+    kpi_col1.metric(
+        "Mes de Equilibrio",
+        kpis["mes_equilibrio"] if kpis["mes_equilibrio"] is not None else "Sin equilibrio",
+        help="Primer mes con Saldo Acumulado positivo"
+    )
+    kpi_col2.metric(f"Saldo Mínimo (mes {kpis['mes_saldo_minimo']})", formatear_pyg(kpis["saldo_minimo"]))
+    kpi_col3.metric(f"Pico Operaciones (mes {kpis['mes_max_operaciones']})", int(kpis["max_operaciones_abiertas"]))
+    kpi_col4.metric("Total No Cobro", formatear_pyg(kpis["total_no_cobro"]))
+    kpi_col5.metric("Saldo Final", formatear_pyg(kpis["saldo_final"]))
     
     # Formatear valores
     for col in ["Ingresos", "Reinversión", "Pago Mensual", "Total Cobrado", "Saldo Acumulado", "Total Disponible", "No Cobro"]:
         flujo_caja[col] = flujo_caja[col].map(formatear_pyg)
     
-    # Mostrar tabla de flujo de caja
-    st.dataframe(flujo_caja, use_container_width=True)
+    # Mostrar tabla de flujo de caja (seleccionar una fila abre el detalle por cohorte)
+    seleccion_flujo = st.dataframe(
+        flujo_caja,
+        use_container_width=True,
+        key="tabla_flujo",
+        on_select="rerun",
+        selection_mode="single-row"
+    )
     
     # Agregar opción para descargar como CSV
     csv = flujo_caja.to_csv(index=True)
@@ -889,3 +869,108 @@ if ejecutar_inversion or agregar_compra or agregar_colocacion or reinversion_aut
         file_name="flujo_de_caja.csv",
         mime="text/csv",
     )
+    
+    # ---- Contribución por cohorte ----
+    meses_seleccionados = seleccion_flujo.selection.rows
+    with st.expander("Contribución por Cohorte", expanded=bool(meses_seleccionados)):
+        if not meses_seleccionados:
+            st.info("Seleccione un mes en la tabla de flujo de caja para ver qué reinversiones componen sus Ingresos y No Cobro")
+        else:
+            import io
+            from fcf_engine import (
+                calcular_contribuciones,
+                contribuciones_a_csv,
+                guardar_contribuciones_npz,
+                top_contribuciones_mes,
+            )
+            
+            mes_seleccionado = meses_seleccionados[0]
+            contribuciones = calcular_contribuciones(parametros_actuales)
+            
+            st.write(f"Principales cohortes del mes {mes_seleccionado}")
+            top_cohortes = top_contribuciones_mes(contribuciones, mes_seleccionado)
+            for col in ["Ingresos", "No Cobro"]:
+                top_cohortes[col] = top_cohortes[col].map(formatear_pyg)
+            st.dataframe(top_cohortes, use_container_width=True, hide_index=True)
+            
+            # Las exportaciones se arman solo al hacer clic: Streamlit ejecuta
+            # el callable de `data` en ese momento, no en cada rerun
+            def exportar_npz():
+                archivo_npz = io.BytesIO()
+                guardar_contribuciones_npz(contribuciones, archivo_npz)
+                return archivo_npz.getvalue()
+            
+            export_col1, export_col2 = st.columns(2)
+            with export_col1:
+                st.download_button(
+                    label="Descargar Contribuciones (CSV)",
+                    data=lambda: contribuciones_a_csv(contribuciones),
+                    file_name="contribuciones_por_cohorte.csv",
+                    mime="text/csv",
+                )
+            with export_col2:
+                st.download_button(
+                    label="Descargar Matriz Dispersa (NPZ)",
+                    data=exportar_npz,
+                    file_name="contribuciones_por_cohorte.npz",
+                    mime="application/octet-stream",
+                    help="Matriz CSR de Ingresos compatible con scipy.sparse.load_npz"
+                )
+    
+    # ---- Escenarios de estrés ----
+    with st.expander("Escenarios de Estrés"):
+        st.write("Shocks aplicados a todas las operaciones abiertas (Inicial, Compra y Colocación) desde el mes indicado")
+        shocks_editados = st.data_editor(
+            pd.DataFrame(SHOCKS_EJEMPLO),
+            num_rows="dynamic",
+            use_container_width=True,
+            key="shocks_estres",
+            column_config={
+                "Tipo": st.column_config.SelectboxColumn(options=list(TIPOS_SHOCK_ETIQUETAS), required=True),
+                "Desde": st.column_config.NumberColumn(min_value=0, step=1, required=True),
+                "Hasta": st.column_config.NumberColumn(min_value=0, step=1),
+                "Valor": st.column_config.NumberColumn(
+                    min_value=0, required=True,
+                    help="Puntos de No Cobro, meses enteros de demora o % de distribución"
+                ),
+                "Aplica a": st.column_config.SelectboxColumn(options=["Todas"] + TIPOS_COHORTE, default="Todas"),
+            }
+        )
+        
+        if st.button("Evaluar Escenarios", key="evaluar_estres"):
+            from fcf_engine import calcular_flujos_estres, calcular_kpis_lote
+            
+            # Agrupar los shocks por escenario; el escenario Base no tiene shocks
+            escenarios = {"Base": []}
+            for fila in shocks_editados.dropna(subset=["Escenario", "Tipo", "Desde", "Valor"]).to_dict("records"):
+                escenarios.setdefault(fila["Escenario"], []).append({
+                    "tipo": TIPOS_SHOCK_ETIQUETAS[fila["Tipo"]],
+                    "desde": int(fila["Desde"]),
+                    "hasta": int(fila["Hasta"]) if pd.notna(fila["Hasta"]) else None,
+                    "valor": fila["Valor"],
+                    "aplica_a": None if fila["Aplica a"] in (None, "Todas") else [fila["Aplica a"]],
+                })
+            
+            try:
+                flujos_estres = calcular_flujos_estres(parametros_actuales, escenarios)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                saldos = flujos_estres[:, :, COLUMNAS_FLUJO.index("Saldo Acumulado")]
+                st.line_chart(pd.DataFrame(saldos.T, columns=list(escenarios)))
+                
+                resumen_estres = calcular_kpis_lote(flujos_estres, nombres=list(escenarios))
+                for col in KPIS_MONETARIOS:
+                    resumen_estres[col] = resumen_estres[col].map(formatear_pyg)
+                st.dataframe(resumen_estres.rename(columns=ETIQUETAS_KPI), use_container_width=True)
+
+# Precargar pandas en segundo plano una vez por proceso, después de mostrar la
+# página: así el primer flujo no paga su importación (FCF_PRECARGA=0 la desactiva)
+@st.cache_resource(show_spinner=False)
+def precargar_modulos():
+    hilo = threading.Thread(target=importlib.import_module, args=("pandas",), name="fcf-precarga", daemon=True)
+    hilo.start()
+    return hilo
+
+if os.environ.get("FCF_PRECARGA", "1") != "0":
+    precargar_modulos()
@@ -0,0 +1,164 @@
+"""Medición del tiempo de arranque de fcf_app.py.
+
+Uso:
+    python fcf_arranque.py --repeticiones 5 --json arranque.json
+    python fcf_arranque.py --comparar arranque.json
+
+Cada medición corre en un proceso nuevo, con streamlit ya importado (como en
+el servidor, donde ya está cargado antes de la primera sesión):
+
+    importacion    importar los módulos de la app
+    primera_carga  primera ejecución del script sin reinversiones (AppTest)
+    precarga       espera hasta que termina la precarga en segundo plano,
+                   que en uso real ocurre mientras el usuario completa datos
+    rerun          una segunda ejecución de la misma sesión
+    primer_flujo   primera ejecución que calcula y muestra el flujo
+
+Informa la mediana de cada paso y qué módulos pesados importa la primera
+carga por sí misma (medido aparte, con FCF_PRECARGA=0). Con --comparar se
+muestra además la diferencia contra un resultado guardado con --json, por
+ejemplo el de la versión anterior.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fcf_app.py")
+
+# Módulos pesados que la primera carga debería evitar
+MODULOS_PESADOS = ["pandas", "numpy", "numba", "pyarrow"]
+
+_MEDICION = r"""
+import json, sys, time
+import streamlit
+from streamlit.testing.v1 import AppTest
+
+app = sys.argv[1]
+sys.path.insert(0, __import__("os").path.dirname(app))
+previos = set(sys.modules)
+
+resultado = {}
+inicio = time.perf_counter()
+at = AppTest.from_file(app, default_timeout=120)
+at.run()
+resultado["primera_carga"] = time.perf_counter() - inicio
+resultado["cargados"] = [m for m in json.loads(sys.argv[2]) if m in sys.modules and m not in previos]
+
+import threading
+inicio = time.perf_counter()
+for hilo in threading.enumerate():
+    if hilo.name == "fcf-precarga":
+        hilo.join()
+resultado["precarga"] = time.perf_counter() - inicio
+
+inicio = time.perf_counter()
+at.run()
+resultado["rerun"] = time.perf_counter() - inicio
+
+inicio = time.perf_counter()
+at.button[[b.label for b in at.button].index("Agregar Compra")].click().run()
+resultado["primer_flujo"] = time.perf_counter() - inicio
+resultado["errores"] = [e.message for e in at.exception]
+print(json.dumps(resultado))
+"""
+
+_IMPORTACION = r"""
+import sys, time
+import streamlit
+sys.path.insert(0, sys.argv[1])
+inicio = time.perf_counter()
+import fcf_engine, fcf_metricas
+print(time.perf_counter() - inicio)
+"""
+
+
+def medir(repeticiones=5):
+    """Correr las mediciones en procesos nuevos y devolver las medianas"""
+    directorio = os.path.dirname(APP)
+    tiempos = {"importacion": [], "primera_carga": [], "precarga": [], "rerun": [], "primer_flujo": []}
+    errores = []
+    for _ in range(repeticiones):
+        salida = subprocess.run(
+            [sys.executable, "-c", _IMPORTACION, directorio],
+            capture_output=True, text=True, check=True
+        )
+        tiempos["importacion"].append(float(salida.stdout.strip().splitlines()[-1]))
+
+        salida = subprocess.run(
+            [sys.executable, "-c", _MEDICION, APP, json.dumps(MODULOS_PESADOS)],
+            capture_output=True, text=True, check=True
+        )
+        resultado = json.loads(salida.stdout.strip().splitlines()[-1])
+        for paso in ("primera_carga", "precarga", "rerun", "primer_flujo"):
+            tiempos[paso].append(resultado[paso])
+        errores += resultado["errores"]
+
+    # Sin precarga, lo que queda cargado es lo que importa el propio script
+    salida = subprocess.run(
+        [sys.executable, "-c", _MEDICION, APP, json.dumps(MODULOS_PESADOS)],
+        capture_output=True, text=True, check=True,
+        env=dict(os.environ, FCF_PRECARGA="0")
+    )
+    cargados = json.loads(salida.stdout.strip().splitlines()[-1])["cargados"]
+
+    return {
+        "repeticiones": repeticiones,
+        "mediana_ms": {paso: statistics.median(v) * 1000 for paso, v in tiempos.items()},
+        "modulos_en_primera_carga": cargados,
+        "errores": errores,
+    }
+
+
+def comparar(anterior, actual):
+    """Líneas con la diferencia de cada paso entre dos resultados de medir()"""
+    lineas = [f"  {'paso':<15}{'antes':>10}{'ahora':>10}{'diferencia':>19}"]
+    for paso, ms in actual["mediana_ms"].items():
+        antes = anterior["mediana_ms"].get(paso)
+        if antes is None:
+            lineas.append(f"  {paso:<15}{'-':>10}{ms:>7.1f} ms")
+            continue
+        porcentaje = f"{(ms - antes) / antes * 100:+.0f}%" if antes else ""
+        lineas.append(f"  {paso:<15}{antes:>7.1f} ms{ms:>7.1f} ms{ms - antes:>+10.1f} ms {porcentaje:>6}")
+    lineas.append(
+        "  módulos pesados en la primera carga: "
+        f"{', '.join(anterior['modulos_en_primera_carga']) or 'ninguno'} -> "
+        f"{', '.join(actual['modulos_en_primera_carga']) or 'ninguno'}"
+    )
+    return lineas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque de la calculadora de flujo de caja")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--json", help="Guardar también el resultado en este archivo")
+    parser.add_argument("--comparar", help="Resultado anterior (guardado con --json) contra el que comparar")
+    args = parser.parse_args()
+
+    anterior = None
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as archivo:
+            anterior = json.load(archivo)
+
+    resultado = medir(args.repeticiones)
+    print(f"Mediana de {resultado['repeticiones']} procesos nuevos:")
+    for paso, ms in resultado["mediana_ms"].items():
+        print(f"  {paso:<15}{ms:>9.1f} ms")
+    cargados = resultado["modulos_en_primera_carga"]
+    print(f"Módulos pesados cargados en la primera carga: {', '.join(cargados) or 'ninguno'}")
+    if anterior is not None:
+        print(f"Comparado con {args.comparar} ({anterior['repeticiones']} procesos):")
+        for linea in comparar(anterior, resultado):
+            print(linea)
+    for error in resultado["errores"]:
+        print(f"Error: {error}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as archivo:
+            json.dump(resultado, archivo, ensure_ascii=False, indent=2)
+    return 1 if resultado["errores"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
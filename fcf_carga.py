@@ -0,0 +1,267 @@
+"""Prueba de carga de fcf_app.py con sesiones concurrentes simuladas.
+
+Uso:
+    python fcf_carga.py --sesiones 8 --repeticiones 2 --meses 24
+
+Cada sesión corre la aplicación sin navegador (streamlit.testing.v1.AppTest)
+y repite un guion de interacciones: carga inicial, ingreso de parámetros,
+Agregar Compra, Reinversión Automática y descarga del CSV. Todas las
+sesiones arrancan a la vez.
+
+Modos:
+    hilos     una sesión por hilo en un mismo proceso, como el servidor de
+              Streamlit (las sesiones compiten por el GIL)
+    procesos  una sesión por proceso; mide la memoria de cada sesión por
+              separado
+
+Informa percentiles de latencia por paso, reruns por segundo y memoria.
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import threading
+import time
+
+import numpy as np
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fcf_app.py")
+
+PASOS = ["carga", "parametros", "agregar_compra", "reinversion_automatica", "descarga_csv"]
+
+
+def _rss_pico_mb():
+    """Pico de memoria residente del proceso (ru_maxrss está en KB en Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _boton(at, etiqueta):
+    return at.button[[b.label for b in at.button].index(etiqueta)]
+
+
+def _verificar_descarga(at):
+    """La descarga no genera un rerun: se verifica el botón del último rerun"""
+    etiquetas = [b.proto.label for b in at.get("download_button")]
+    if "Descargar como CSV" not in etiquetas:
+        raise AssertionError("falta el botón Descargar como CSV")
+
+
+def _resultado_fallido(sesion, error, rss_mb=0.0):
+    """Resultado de una sesión que no llegó a correr el guion"""
+    return {
+        "sesion": sesion,
+        "duracion": 0.0,
+        "tiempos": {paso: [] for paso in PASOS},
+        "errores": [f"sesión {sesion}: {error}"],
+        "rss_inicial_mb": rss_mb,
+        "rss_pico_mb": rss_mb,
+    }
+
+
+def ejecutar_sesion(sesion, barrera, repeticiones, meses_total, timeout):
+    """Correr el guion de una sesión y devolver sus tiempos por paso"""
+    from streamlit.testing.v1 import AppTest
+
+    tiempos = {paso: [] for paso in PASOS}
+    errores = []
+    rss_inicial = _rss_pico_mb()
+    try:
+        # Si otra sesión no llega (por ejemplo, su proceso murió) no se espera para siempre
+        barrera.wait(timeout=timeout)
+    except threading.BrokenBarrierError:
+        return _resultado_fallido(sesion, "otra sesión no llegó a la barrera de inicio", rss_inicial)
+    inicio = time.perf_counter()
+
+    for repeticion in range(repeticiones):
+        at = AppTest.from_file(APP, default_timeout=timeout)
+        pasos = [
+            ("carga", lambda: at.run()),
+            ("parametros", lambda: (
+                at.number_input(key="meses_total").set_value(meses_total),
+                at.number_input(key="inv_inicial").set_value(30000000 + 1000000 * sesion),
+                at.number_input(key="pago_mensual").set_value(1000000).run(),
+            )),
+            ("agregar_compra", lambda: _boton(at, "Agregar Compra").click().run()),
+            ("reinversion_automatica", lambda: _boton(at, "Reinversión Automática").click().run()),
+            ("descarga_csv", lambda: _verificar_descarga(at)),
+        ]
+        for paso, accion in pasos:
+            t0 = time.perf_counter()
+            try:
+                accion()
+            except Exception as e:
+                errores.append(f"sesión {sesion}, repetición {repeticion}, {paso}: {e!r}")
+                break
+            tiempos[paso].append(time.perf_counter() - t0)
+            if at.exception:
+                errores.append(f"sesión {sesion}, repetición {repeticion}, {paso}: {at.exception[0].message}")
+                break
+
+    return {
+        "sesion": sesion,
+        "duracion": time.perf_counter() - inicio,
+        "tiempos": tiempos,
+        "errores": errores,
+        "rss_inicial_mb": rss_inicial,
+        "rss_pico_mb": _rss_pico_mb(),
+    }
+
+
+def _sesion_en_proceso(cola, sesion, *args):
+    try:
+        resultado = ejecutar_sesion(sesion, *args)
+    except Exception as e:
+        resultado = _resultado_fallido(sesion, repr(e))
+    cola.put(resultado)
+
+
+def _juntar_resultados(cola, procesos, limite):
+    """Leer un resultado por proceso sin bloquear si alguno muere o se cuelga
+
+    Los procesos que no entregan resultado antes de `limite` segundos, o que
+    terminan sin entregarlo, se informan como sesiones con error.
+    """
+    resultados = {}
+    vencimiento = time.monotonic() + limite
+    while len(resultados) < len(procesos) and time.monotonic() < vencimiento:
+        try:
+            resultado = cola.get(timeout=1)
+        except queue.Empty:
+            if not any(proceso.is_alive() for proceso in procesos):
+                break
+            continue
+        resultados[resultado["sesion"]] = resultado
+
+    for sesion, proceso in enumerate(procesos):
+        proceso.join(timeout=5)
+        colgado = proceso.is_alive()
+        if colgado:
+            proceso.terminate()
+            proceso.join()
+        if sesion not in resultados:
+            if colgado:
+                error = f"sin resultado tras {limite:.0f} s; proceso terminado"
+            else:
+                error = f"el proceso terminó sin resultado (código de salida {proceso.exitcode})"
+            resultados[sesion] = _resultado_fallido(sesion, error)
+    return [resultados[sesion] for sesion in range(len(procesos))]
+
+
+def correr_carga(sesiones=8, repeticiones=1, meses_total=24, modo="hilos", timeout=120):
+    """Lanzar las sesiones concurrentes y juntar sus resultados"""
+    if modo == "hilos":
+        importlib.import_module("streamlit.testing.v1")  # importar antes de medir
+
+        barrera = threading.Barrier(sesiones)
+        resultados = [None] * sesiones
+        rss_base = _rss_pico_mb()
+
+        def correr(i):
+            resultados[i] = ejecutar_sesion(i, barrera, repeticiones, meses_total, timeout)
+
+        hilos = [threading.Thread(target=correr, args=(i,)) for i in range(sesiones)]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+        # Los hilos comparten el proceso: se reparte el crecimiento entre las sesiones
+        memoria = [(_rss_pico_mb() - rss_base) / sesiones] * sesiones
+    else:
+        contexto = multiprocessing.get_context("spawn")
+        barrera = contexto.Barrier(sesiones)
+        cola = contexto.Queue()
+        procesos = [
+            contexto.Process(
+                target=_sesion_en_proceso,
+                args=(cola, i, barrera, repeticiones, meses_total, timeout)
+            )
+            for i in range(sesiones)
+        ]
+        inicio = time.perf_counter()
+        for proceso in procesos:
+            proceso.start()
+        # Cada rerun está acotado por `timeout`; se suman dos más por el
+        # arranque del proceso y la barrera
+        resultados = _juntar_resultados(cola, procesos, timeout * (len(PASOS) * repeticiones + 2))
+        # Se mide desde la barrera, sin el arranque de los procesos; la
+        # memoria incluye lo que la primera ejecución de la app importa
+        duracion = max(r["duracion"] for r in resultados)
+        memoria = [r["rss_pico_mb"] - r["rss_inicial_mb"] for r in resultados]
+
+    return resumir(resultados, duracion, memoria, modo)
+
+
+def resumir(resultados, duracion, memoria, modo):
+    """Percentiles por paso, rendimiento y memoria por sesión"""
+    latencias = {}
+    for paso in PASOS:
+        valores = np.array([t for r in resultados for t in r["tiempos"][paso]]) * 1000
+        if paso == "descarga_csv" or len(valores) == 0:
+            continue
+        latencias[paso] = {
+            "n": len(valores),
+            "p50_ms": float(np.percentile(valores, 50)),
+            "p90_ms": float(np.percentile(valores, 90)),
+            "p99_ms": float(np.percentile(valores, 99)),
+            "max_ms": float(valores.max()),
+        }
+    reruns = sum(v["n"] for v in latencias.values())
+    return {
+        "modo": modo,
+        "sesiones": len(resultados),
+        "duracion_s": duracion,
+        "reruns": reruns,
+        "reruns_por_s": reruns / duracion if duracion > 0 else 0.0,
+        "latencias": latencias,
+        "memoria_sesion_mb": {
+            "media": float(np.mean(memoria)),
+            "max": float(np.max(memoria)),
+        },
+        "errores": [e for r in resultados for e in r["errores"]],
+    }
+
+
+def imprimir_resumen(resumen):
+    print(f"Modo: {resumen['modo']}  Sesiones: {resumen['sesiones']}  "
+          f"Duración: {resumen['duracion_s']:.2f} s")
+    print(f"Reruns: {resumen['reruns']}  Rendimiento: {resumen['reruns_por_s']:.2f} reruns/s")
+    print()
+    print(f"{'Paso':<24}{'n':>5}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'máx ms':>10}")
+    for paso, lat in resumen["latencias"].items():
+        print(f"{paso:<24}{lat['n']:>5}{lat['p50_ms']:>10.1f}{lat['p90_ms']:>10.1f}"
+              f"{lat['p99_ms']:>10.1f}{lat['max_ms']:>10.1f}")
+    print()
+    memoria = resumen["memoria_sesion_mb"]
+    print(f"Memoria por sesión: media {memoria['media']:.1f} MB, máx {memoria['max']:.1f} MB")
+    if resumen["errores"]:
+        print(f"\nErrores ({len(resumen['errores'])}):")
+        for error in resumen["errores"]:
+            print(f"  {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la calculadora de flujo de caja")
+    parser.add_argument("--sesiones", type=int, default=8, help="Sesiones concurrentes")
+    parser.add_argument("--repeticiones", type=int, default=1, help="Veces que cada sesión repite el guion")
+    parser.add_argument("--meses", type=int, default=24,
+                        help="Meses a proyectar; la reinversión automática crece exponencialmente con el horizonte")
+    parser.add_argument("--modo", choices=["hilos", "procesos"], default="hilos")
+    parser.add_argument("--timeout", type=float, default=120, help="Tiempo máximo por rerun (s)")
+    parser.add_argument("--json", help="Guardar también el resumen en este archivo")
+    args = parser.parse_args()
+
+    resumen = correr_carga(args.sesiones, args.repeticiones, args.meses, args.modo, args.timeout)
+    imprimir_resumen(resumen)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as archivo:
+            json.dump(resumen, archivo, ensure_ascii=False, indent=2)
+    return 1 if resumen["errores"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,884 @@
+import importlib
+import numbers
+
+from fcf_kernels import reinversion_automatica
+from fcf_metricas import GENERAR_FLUJO_SEGUNDOS, medir_tiempo
+
+
+class _ModuloDiferido:
+    """Módulo que se importa recién en el primer acceso a uno de sus atributos.
+
+    Al importarlo reemplaza su nombre global por el módulo real, así que solo
+    el primer acceso pasa por aquí.
+    """
+
+    def __init__(self, modulo, nombre_global):
+        self._modulo = modulo
+        self._nombre_global = nombre_global
+
+    def __getattr__(self, atributo):
+        modulo = importlib.import_module(self._modulo)
+        globals()[self._nombre_global] = modulo
+        return getattr(modulo, atributo)
+
+
+# numpy y pandas cuestan más que todo el resto del motor y la primera página de
+# la app solo necesita las constantes, calcular_operaciones y crear_reinversion
+np = _ModuloDiferido("numpy", "np")
+pd = _ModuloDiferido("pandas", "pd")
+
+# Columnas del flujo de caja en el orden en que se muestran
+COLUMNAS_FLUJO = [
+    "Ingresos",
+    "Reinversión",
+    "Pago Mensual",
+    "Total Cobrado",
+    "Saldo Acumulado",
+    "Total Disponible",
+    "No Cobro",
+    "Operaciones Abiertas",
+    "Reinversiones Automáticas Mes",
+    "Reinversiones Automáticas Total",
+]
+
+# Campos obligatorios de cada reinversión (Compra o Colocación)
+CAMPOS_REINVERSION = [
+    "mes",
+    "inversion",
+    "cuotas",
+    "importe",
+    "meses_sin_cobros",
+    "cuotas_regulacion",
+    "importe_regulacion",
+    "pct_distribucion",
+    "no_cobro",
+    "ops",
+    "meses_demora",
+]
+
+
+def calcular_operaciones(inversion, costo_op):
+    """Calcular número de operaciones basadas en inversión y costo"""
+    try:
+        if costo_op > 0:
+            return max(1, inversion // costo_op)
+        return 0
+    except:
+        return 0
+
+
+def crear_reinversion(mes, inversion, cuotas, importe, meses_sin_cobros,
+                      cuotas_regulacion, importe_regulacion, pct_distribucion,
+                      no_cobro, ops, meses_demora, automatica=False):
+    """Crear el diccionario de una reinversión tal como lo consume generar_flujo"""
+    return {
+        "mes": mes,
+        "inversion": inversion,
+        "cuotas": cuotas,
+        "importe": importe,
+        "meses_sin_cobros": meses_sin_cobros,
+        "cuotas_regulacion": cuotas_regulacion,
+        "importe_regulacion": importe_regulacion,
+        "pct_distribucion": pct_distribucion,
+        "no_cobro": no_cobro,
+        "ops": ops,
+        "meses_demora": meses_demora,
+        "automatica": automatica
+    }
+
+
+# Tipos de cohorte: la inversión inicial y cada reinversión
+TIPOS_COHORTE = ["Inicial", "Compra", "Colocación"]
+TIPO_INICIAL, TIPO_COMPRA, TIPO_COLOCACION = range(3)
+
+# Tipos de shock admitidos en los escenarios de estrés
+TIPOS_SHOCK = ["no_cobro", "demora", "pct_distribucion"]
+
+# Tramos de cuotas que pueden tener su propia curva de mora por antigüedad
+TRAMOS_CURVA = ["cuotas", "regulacion"]
+
+# Escala de las tasas en el modo exacto: porcentajes en centésimas (puntos básicos)
+ESCALA_EXACTA = 10000
+
+# Mayor magnitud admitida en los cálculos int64 del modo exacto; se deja
+# margen bajo 2**63 para las sumas y los acumulados
+LIMITE_EXACTO = 2 ** 62
+
+_COL = {nombre: i for i, nombre in enumerate(COLUMNAS_FLUJO)}
+
+
+def construir_cohortes(parametros):
+    """Convertir la inversión inicial y las reinversiones en arreglos por cohorte.
+
+    La cohorte 0 es la inversión inicial; luego vienen las reinversiones
+    Compra y Colocación en el orden de sus listas.
+    """
+    meses_total = parametros["meses_total"]
+    reinversiones = (
+        [(TIPO_COMPRA, r) for r in parametros["reinversiones_compra"]] +
+        [(TIPO_COLOCACION, r) for r in parametros["reinversiones_colocacion"]]
+    )
+
+    demora_inicial = parametros["meses_demora_inicial"]
+    cuotas_inicial = parametros["cuotas_inicial"]
+    # La inversión inicial cobra desde el mes 1, pero su regulación se cuenta
+    # desde el mes 0 (así lo hace el cálculo original)
+    filas = [(
+        TIPO_INICIAL, 0, 0, 0, False,
+        parametros["ops_inicial"],
+        1 + demora_inicial,
+        cuotas_inicial,
+        parametros["importe_inicial"],
+        demora_inicial + cuotas_inicial + parametros["meses_sin_cobros_inicial"],
+        parametros["cuotas_regulacion_inicial"],
+        parametros["importe_regulacion_inicial"],
+        parametros["pct_distribucion_inicial"],
+        parametros["no_cobro_inicial"],
+    )]
+    for tipo, r in reinversiones:
+        inicio_cuotas = r["mes"] + r["meses_demora"]
+        filas.append((
+            tipo, r["mes"], min(r["mes"], meses_total - 1), r["inversion"],
+            bool(r.get("automatica", False)) and tipo == TIPO_COLOCACION,
+            r["ops"],
+            inicio_cuotas,
+            r["cuotas"],
+            r["importe"],
+            inicio_cuotas + r["cuotas"] + r["meses_sin_cobros"],
+            r["cuotas_regulacion"],
+            r["importe_regulacion"],
+            r["pct_distribucion"],
+            r["no_cobro"],
+        ))
+
+    columnas = list(zip(*filas))
+    return {
+        "tipo": np.array(columnas[0], dtype=np.int64),
+        "mes": np.array(columnas[1], dtype=np.int64),
+        "mes_inversion": np.array(columnas[2], dtype=np.int64),
+        "inversion": np.array(columnas[3], dtype=float),
+        "automatica": np.array(columnas[4], dtype=bool),
+        "ops": np.array(columnas[5], dtype=float),
+        "inicio_cuotas": np.array(columnas[6], dtype=np.int64),
+        "cuotas": np.array(columnas[7], dtype=np.int64),
+        "importe": np.array(columnas[8], dtype=float),
+        "inicio_regulacion": np.array(columnas[9], dtype=np.int64),
+        "cuotas_regulacion": np.array(columnas[10], dtype=np.int64),
+        "importe_regulacion": np.array(columnas[11], dtype=float),
+        "pct_distribucion": np.array(columnas[12], dtype=float),
+        "no_cobro": np.array(columnas[13], dtype=float),
+    }
+
+
+def _expandir_tramo(inicio, cantidad, meses_total):
+    """Expandir tramos [inicio, inicio + cantidad) en celdas (cohorte, mes, edad)"""
+    if meses_total is not None:
+        cantidad = np.minimum(cantidad, meses_total - inicio)
+    n = np.clip(cantidad, 0, None)
+    cohorte = np.repeat(np.arange(len(n)), n)
+    edad = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    return cohorte, inicio[cohorte] + edad, edad
+
+
+def expandir_cuotas(cohortes, meses_total):
+    """Celdas no nulas de la matriz cohorte × mes: una por cuota cobrada.
+
+    `edad` es el número de cuota dentro de su tramo (0 = primera cuota) y
+    `regulacion` distingue las cuotas de regulación de las normales. Con
+    `meses_total=None` se expande el calendario completo de cada cohorte,
+    incluidas las cuotas fuera del horizonte.
+    """
+    c_n, mes_n, edad_n = _expandir_tramo(cohortes["inicio_cuotas"], cohortes["cuotas"], meses_total)
+    c_r, mes_r, edad_r = _expandir_tramo(cohortes["inicio_regulacion"], cohortes["cuotas_regulacion"], meses_total)
+    return {
+        "cohorte": np.concatenate([c_n, c_r]),
+        "mes": np.concatenate([mes_n, mes_r]),
+        "edad": np.concatenate([edad_n, edad_r]),
+        "regulacion": np.concatenate([np.zeros(len(c_n), dtype=bool), np.ones(len(c_r), dtype=bool)]),
+    }
+
+
+def _tabla_curvas(curvas):
+    """Tabla (tipo de cohorte × tramo) × edad con el % No Cobro efectivo.
+
+    Cada curva se extiende con su último valor hasta la curva más larga; las
+    filas sin curva quedan en NaN.
+    """
+    series = {}
+    for plantilla, tramos in curvas.items():
+        if plantilla not in TIPOS_COHORTE:
+            raise ValueError(f"Plantilla de curva desconocida: {plantilla!r}")
+        for tramo, curva in tramos.items():
+            if tramo not in TRAMOS_CURVA:
+                raise ValueError(f"Tramo de curva desconocido: {tramo!r}")
+            no_cobro = np.asarray(curva["no_cobro"], dtype=float)
+            recupero = np.asarray(curva.get("recupero", np.zeros(len(no_cobro))), dtype=float)
+            if no_cobro.ndim != 1 or len(no_cobro) == 0 or recupero.shape != no_cobro.shape:
+                raise ValueError(
+                    f"La curva {plantilla}/{tramo} debe tener 'no_cobro' y 'recupero' "
+                    "del mismo largo (al menos una cuota)"
+                )
+            fila = TIPOS_COHORTE.index(plantilla) * len(TRAMOS_CURVA) + TRAMOS_CURVA.index(tramo)
+            series[fila] = np.clip(no_cobro, 0, 100) * (1 - np.clip(recupero, 0, 100) / 100)
+
+    largo = max((len(serie) for serie in series.values()), default=1)
+    tabla = np.full((len(TIPOS_COHORTE) * len(TRAMOS_CURVA), largo), np.nan)
+    for fila, serie in series.items():
+        tabla[fila, :len(serie)] = serie
+        tabla[fila, len(serie):] = serie[-1]
+    return tabla
+
+
+def no_cobro_celdas(cohortes, celdas, curvas=None):
+    """% No Cobro de cada celda antes de aplicar estrés.
+
+    `curvas` asocia cada plantilla ("Inicial", "Compra", "Colocación") y tramo
+    ("cuotas", "regulacion") con listas "no_cobro" y "recupero" (opcional) en
+    %, indexadas por la edad de la cuota (0 = primera cuota del tramo). El
+    % efectivo es no_cobro × (1 - recupero / 100) y reemplaza al % No Cobro
+    plano de la cohorte; pasada la última edad se mantiene el último valor.
+    Las celdas sin curva usan el % plano.
+    """
+    c = celdas["cohorte"]
+    no_cobro = cohortes["no_cobro"][c]
+    if not curvas:
+        return no_cobro
+
+    tabla = _tabla_curvas(curvas)
+    fila = cohortes["tipo"][c] * len(TRAMOS_CURVA) + celdas["regulacion"]
+    de_curva = tabla[fila, np.minimum(celdas["edad"], tabla.shape[1] - 1)]
+    return np.where(np.isnan(de_curva), no_cobro, de_curva)
+
+
+def cargar_curvas_csv(archivo):
+    """Armar curvas de mora desde un CSV de cosechas observadas.
+
+    Columnas: plantilla, tramo, cuota (desde 1), bruto, no_cobrado y,
+    opcionalmente, recuperado, todas en montos. Se suman las filas de una
+    misma plantilla, tramo y cuota; % No Cobro = no_cobrado / bruto y
+    % Recupero = recuperado / no_cobrado. Las cuotas sin datos se interpolan.
+    """
+    datos = pd.read_csv(archivo)
+    datos.columns = [str(col).strip().lower() for col in datos.columns]
+    faltantes = [col for col in ("plantilla", "tramo", "cuota", "bruto", "no_cobrado") if col not in datos]
+    if faltantes:
+        raise ValueError(f"Faltan columnas en el CSV de curvas: {', '.join(faltantes)}")
+    if "recuperado" not in datos:
+        datos["recuperado"] = 0.0
+
+    datos["plantilla"] = datos["plantilla"].astype(str).str.strip().replace({"Colocacion": "Colocación"})
+    datos["tramo"] = datos["tramo"].astype(str).str.strip().str.lower().replace({"regulación": "regulacion"})
+    for col in ("cuota", "bruto", "no_cobrado", "recuperado"):
+        numeros = pd.to_numeric(datos[col], errors="coerce")
+        invalidos = numeros.isna() & datos[col].notna()
+        if invalidos.any():
+            raise ValueError(
+                f"La columna '{col}' del CSV de curvas tiene valores no numéricos: "
+                f"{', '.join(map(repr, datos.loc[invalidos, col].unique()[:3]))}"
+            )
+        datos[col] = numeros
+    if datos["cuota"].isna().any() or (datos["cuota"] % 1 != 0).any():
+        raise ValueError("La columna 'cuota' del CSV de curvas debe tener números enteros en todas las filas")
+    if (datos["cuota"] < 1).any():
+        raise ValueError("Las cuotas del CSV de curvas se numeran desde 1")
+
+    datos["cuota"] = datos["cuota"].astype(int)
+    totales = datos.groupby(["plantilla", "tramo", "cuota"])[["bruto", "no_cobrado", "recuperado"]].sum()
+    curvas = {}
+    for (plantilla, tramo), grupo in totales.groupby(level=["plantilla", "tramo"]):
+        grupo = grupo.droplevel(["plantilla", "tramo"])
+        grupo = grupo.reindex(range(1, grupo.index.max() + 1))
+        no_cobro = (grupo["no_cobrado"] / grupo["bruto"].where(grupo["bruto"] > 0) * 100)
+        recupero = (grupo["recuperado"] / grupo["no_cobrado"].where(grupo["no_cobrado"] > 0) * 100)
+        curvas.setdefault(plantilla, {})[tramo] = {
+            "no_cobro": no_cobro.interpolate(limit_direction="both").fillna(0).tolist(),
+            "recupero": recupero.interpolate(limit_direction="both").fillna(0).tolist(),
+        }
+
+    # Validar nombres y largos antes de devolver
+    _tabla_curvas(curvas)
+    return curvas
+
+
+def _validar_shock(shock):
+    """Rechazar con ValueError los shocks mal formados, antes de tocar las celdas"""
+    if not isinstance(shock, dict):
+        raise ValueError(f"Cada shock debe ser un diccionario, no {type(shock).__name__}: {shock!r}")
+    if shock.get("tipo") not in TIPOS_SHOCK:
+        raise ValueError(f"Tipo de shock desconocido: {shock.get('tipo')!r}")
+    for campo in ("desde", "valor"):
+        if shock.get(campo) is None:
+            raise ValueError(f"Falta '{campo}' en el shock {shock['tipo']!r}")
+    for campo in ("desde", "hasta", "valor"):
+        valor = shock.get(campo)
+        if valor is not None and (isinstance(valor, bool) or not isinstance(valor, numbers.Real)):
+            raise ValueError(f"'{campo}' del shock {shock['tipo']!r} debe ser un número: {valor!r}")
+    if shock["tipo"] == "demora" and (shock["valor"] < 0 or shock["valor"] != int(shock["valor"])):
+        raise ValueError(
+            f"La demora debe ser una cantidad entera de meses no negativa: {shock['valor']!r}"
+        )
+    desconocidos = [nombre for nombre in shock.get("aplica_a") or [] if nombre not in TIPOS_COHORTE]
+    if desconocidos:
+        raise ValueError(f"Tipo de cohorte desconocido en 'aplica_a': {', '.join(map(repr, desconocidos))}")
+
+
+def aplicar_estres(cohortes, celdas, shocks, no_cobro=None):
+    """Aplicar shocks dependientes del tiempo a todas las celdas a la vez.
+
+    Cada shock es un diccionario con:
+        tipo      "no_cobro" (suma puntos de % No Cobro), "demora" (atrasa los
+                  cobros `valor` meses) o "pct_distribucion" (fija el % de
+                  distribución de las cuotas de regulación)
+        desde     primer mes afectado
+        hasta     último mes afectado (opcional, sin límite por defecto)
+        valor     magnitud del shock
+        aplica_a  lista de tipos de cohorte afectados (opcional, todas por defecto)
+
+    Las demoras se aplican primero y en orden; los demás shocks se evalúan
+    sobre el mes de cobro ya demorado. `no_cobro` es el % base por celda (ver
+    no_cobro_celdas); por defecto el plano de cada cohorte. Devuelve
+    (mes, no_cobro, pct_distribucion) por celda.
+    """
+    c = celdas["cohorte"]
+    mes = celdas["mes"].copy()
+    no_cobro = (cohortes["no_cobro"][c] if no_cobro is None else no_cobro).copy()
+    pct_distribucion = cohortes["pct_distribucion"][c].copy()
+
+    for shock in shocks:
+        _validar_shock(shock)
+    orden = sorted(shocks, key=lambda shock: shock["tipo"] != "demora")
+
+    for shock in orden:
+        afectadas = mes >= shock["desde"]
+        if shock.get("hasta") is not None:
+            afectadas &= mes <= shock["hasta"]
+        if shock.get("aplica_a"):
+            tipos = [TIPOS_COHORTE.index(nombre) for nombre in shock["aplica_a"]]
+            afectadas &= np.isin(cohortes["tipo"][c], tipos)
+
+        if shock["tipo"] == "demora":
+            mes[afectadas] += int(shock["valor"])
+        elif shock["tipo"] == "no_cobro":
+            no_cobro[afectadas] += shock["valor"]
+        else:
+            pct_distribucion[afectadas & celdas["regulacion"]] = shock["valor"]
+
+    return mes, np.clip(no_cobro, 0, 100), pct_distribucion
+
+
+def _a_enteros(valores):
+    return np.rint(valores).astype(np.int64)
+
+
+def _sumar_enteros(indices, valores, n):
+    """Suma exacta de enteros por índice.
+
+    bincount suma en punto flotante, que es exacto mientras los totales no
+    pasen de 2**53; si pudieran pasar, se suman por separado los 26 bits
+    bajos y los altos.
+    """
+    if len(valores) == 0 or valores.min() >= 0:
+        # Sin negativos, las sumas parciales no superan el total de su índice
+        sumas = np.bincount(indices, valores, minlength=n)
+        if sumas.max(initial=0) < 2 ** 53:
+            return sumas.astype(np.int64)
+    elif np.abs(valores).sum() < 2 ** 53:
+        return np.bincount(indices, valores, minlength=n).astype(np.int64)
+    bajos = np.bincount(indices, valores & 0x3FFFFFF, minlength=n)
+    altos = np.bincount(indices, valores >> 26, minlength=n)
+    return (altos.astype(np.int64) << 26) + bajos.astype(np.int64)
+
+
+def _redondear_con_residuo(numerador, grupo, n_grupos, escala=ESCALA_EXACTA):
+    """Dividir `numerador` por `escala` en enteros que cuadran por grupo.
+
+    Cada celda recibe el cociente truncado; luego el residuo de cada grupo
+    (la diferencia con el total del grupo redondeado a la mitad hacia arriba)
+    se reparte de a 1 entre las celdas con mayor resto, y a igual resto entre
+    las primeras. Así la suma de cada grupo es exactamente su total redondeado.
+    """
+    base = numerador // escala
+    resto = numerador - base * escala
+
+    # round(Σ numerador / escala) - Σ base solo depende de la suma de los
+    # restos; cada resto es menor que la escala, así que bincount los suma sin
+    # error. Nunca supera la cantidad de celdas del grupo con resto
+    suma_restos = np.bincount(grupo, resto, minlength=n_grupos).astype(np.int64)
+    residuo = (suma_restos + escala // 2) // escala
+
+    # Ordenar por grupo y, dentro de cada grupo, de mayor a menor resto, con
+    # una sola clave entera; el orden estable deja primero, a igual resto, a
+    # las celdas anteriores
+    clave = grupo * escala - resto
+    orden = np.argsort(clave, kind="stable")
+    # Cada grupo ocupa un tramo contiguo del orden: reciben 1 sus primeras
+    # `residuo` celdas, es decir las posiciones [inicio, inicio + residuo)
+    inicio = np.searchsorted(clave[orden], np.arange(n_grupos) * escala - (escala - 1))
+    desplazamiento = np.repeat(inicio - (np.cumsum(residuo) - residuo), residuo)
+    base[orden[np.arange(len(desplazamiento)) + desplazamiento]] += 1
+    return base
+
+
+def _verificar_limite_exacto(cohortes, celdas, pct_distribucion):
+    """ValueError si los montos desbordarían los enteros de 64 bits.
+
+    Se estima en punto flotante el mayor producto (monto por la escala de
+    las tasas) y el total cobrado del calendario completo.
+    """
+    regulacion = celdas["regulacion"]
+    pct = np.abs(pct_distribucion[regulacion]).max(initial=0) / 100
+    por_cuota = np.abs(cohortes["ops"] * cohortes["importe"])
+    por_cuota_regulacion = np.abs(cohortes["ops"] * cohortes["importe_regulacion"]) * pct
+    mayor_producto = max(por_cuota.max(initial=0), por_cuota_regulacion.max(initial=0)) * ESCALA_EXACTA
+    total = (por_cuota * cohortes["cuotas"] + por_cuota_regulacion * cohortes["cuotas_regulacion"]).sum()
+    if mayor_producto >= LIMITE_EXACTO or total >= LIMITE_EXACTO:
+        raise ValueError(
+            "Los montos son demasiado grandes para el modo exacto (enteros de 64 bits); "
+            "revise las operaciones (costo operativo) y los importes, o desactive el modo exacto"
+        )
+
+
+def _montos_celdas_exactos(cohortes, celdas, no_cobro, pct_distribucion):
+    """Ingreso y No Cobro de cada celda en guaraníes enteros.
+
+    Reglas de redondeo:
+      - cuota normal: bruto = ops × importe, exacto
+      - cuota de regulación: bruto = ops × importe × % distribución, redondeado
+        con reparto del residuo dentro de la cohorte
+      - No Cobro = bruto × % No Cobro, redondeado con reparto del residuo
+        dentro de la cohorte; Ingreso = bruto - No Cobro
+    Los porcentajes se toman en centésimas de punto. Ingreso + No Cobro
+    reproduce el bruto de cada cuota sin diferencias.
+    """
+    _verificar_limite_exacto(cohortes, celdas, pct_distribucion)
+    c = celdas["cohorte"]
+    n_cohortes = len(cohortes["tipo"])
+    regulacion = celdas["regulacion"]
+    ops = _a_enteros(cohortes["ops"])
+
+    bruto = (ops * _a_enteros(cohortes["importe"]))[c]
+    c_regulacion = c[regulacion]
+    numerador_regulacion = (
+        (ops * _a_enteros(cohortes["importe_regulacion"]))[c_regulacion] *
+        _a_enteros(pct_distribucion[regulacion] * 100)
+    )
+    bruto[regulacion] = _redondear_con_residuo(numerador_regulacion, c_regulacion, n_cohortes)
+
+    perdido = _redondear_con_residuo(bruto * _a_enteros(no_cobro * 100), c, n_cohortes)
+    return bruto - perdido, perdido
+
+
+def _sumar_por_mes(mes, valores, meses_total):
+    """Sumar valores por mes; en enteros no se pasa por punto flotante"""
+    if valores.dtype.kind == "f":
+        return np.bincount(mes, valores, minlength=meses_total)
+    return _sumar_enteros(mes, valores, meses_total)
+
+
+def _montos_celdas(cohortes, celdas, no_cobro, pct_distribucion):
+    """Ingreso y No Cobro de cada celda"""
+    c = celdas["cohorte"]
+    monto = np.where(
+        celdas["regulacion"],
+        # Aplicar el porcentaje de distribución al importe de la regulación
+        cohortes["importe_regulacion"][c] * (pct_distribucion / 100),
+        cohortes["importe"][c]
+    )
+    ops = cohortes["ops"][c]
+    ingreso = ops * (monto * (1 - no_cobro / 100))
+    perdido = ops * (monto * (no_cobro / 100))
+    return ingreso, perdido
+
+
+def _flujo_array(parametros, cohortes, celdas, mes, no_cobro, pct_distribucion):
+    """Agregar las celdas por mes y calcular las columnas acumuladas"""
+    meses_total = parametros["meses_total"]
+    exacto = parametros.get("exacto", False)
+    if exacto:
+        ingreso, perdido = _montos_celdas_exactos(cohortes, celdas, no_cobro, pct_distribucion)
+        ops = _a_enteros(cohortes["ops"])
+        inversion = _a_enteros(cohortes["inversion"])
+        automatica = cohortes["automatica"].astype(np.int64)
+    else:
+        ingreso, perdido = _montos_celdas(cohortes, celdas, no_cobro, pct_distribucion)
+        ops, inversion, automatica = cohortes["ops"], cohortes["inversion"], cohortes["automatica"]
+
+    # Las demoras de estrés pueden empujar cobros fuera del horizonte
+    dentro = mes < meses_total
+    mes, ingreso, perdido = mes[dentro], ingreso[dentro], perdido[dentro]
+    # Las operaciones abiertas se cuentan solo en las cuotas normales
+    normal = ~celdas["regulacion"][dentro]
+    ops_celda = ops[celdas["cohorte"][dentro]]
+
+    flujo = np.zeros((meses_total, len(COLUMNAS_FLUJO)), dtype=np.int64 if exacto else float)
+    flujo[:, _COL["Ingresos"]] = _sumar_por_mes(mes, ingreso, meses_total)
+    flujo[:, _COL["No Cobro"]] = _sumar_por_mes(mes, perdido, meses_total)
+    flujo[:, _COL["Operaciones Abiertas"]] = _sumar_por_mes(mes[normal], ops_celda[normal], meses_total)
+    flujo[:, _COL["Reinversión"]] = _sumar_por_mes(cohortes["mes_inversion"], inversion, meses_total)
+    flujo[:, _COL["Reinversiones Automáticas Mes"]] = _sumar_por_mes(
+        cohortes["mes_inversion"], automatica, meses_total
+    )
+
+    # Aplicar pago mensual solo durante los meses especificados
+    pago_mensual = round(parametros["pago_mensual"]) if exacto else parametros["pago_mensual"]
+    flujo[1:min(parametros["meses_pago"] + 1, meses_total), _COL["Pago Mensual"]] = pago_mensual
+
+    # Calcular totales acumulados
+    total_cobrado = flujo[:, _COL["Ingresos"]].cumsum()
+    disponible = (
+        total_cobrado -
+        flujo[:, _COL["Reinversión"]].cumsum() -
+        flujo[:, _COL["Pago Mensual"]].cumsum()
+    )
+    flujo[:, _COL["Total Cobrado"]] = total_cobrado
+    flujo[:, _COL["Total Disponible"]] = disponible
+    # Saldo Acumulado considera además la inversión inicial
+    inv_inicial = round(parametros["inv_inicial"]) if exacto else parametros["inv_inicial"]
+    flujo[:, _COL["Saldo Acumulado"]] = -inv_inicial + disponible
+    flujo[:, _COL["Reinversiones Automáticas Total"]] = flujo[:, _COL["Reinversiones Automáticas Mes"]].cumsum()
+    return flujo
+
+
+def _expandir_parametros(parametros, cohortes):
+    # En el modo exacto el redondeo se reparte sobre el calendario completo de
+    # cada cohorte, para que no dependa de dónde corta el horizonte
+    if parametros.get("exacto", False):
+        return expandir_cuotas(cohortes, None)
+    return expandir_cuotas(cohortes, parametros["meses_total"])
+
+
+@medir_tiempo(GENERAR_FLUJO_SEGUNDOS, calculo="flujo")
+def calcular_flujo_array(parametros):
+    """Flujo de caja como arreglo meses × columnas (orden de COLUMNAS_FLUJO).
+
+    Con `parametros["exacto"]` el arreglo es int64 en guaraníes enteros.
+    """
+    cohortes = construir_cohortes(parametros)
+    celdas = _expandir_parametros(parametros, cohortes)
+    return _flujo_array(
+        parametros, cohortes, celdas,
+        celdas["mes"],
+        no_cobro_celdas(cohortes, celdas, parametros.get("curvas")),
+        cohortes["pct_distribucion"][celdas["cohorte"]]
+    )
+
+
+# Función para generar flujo de caja
+def generar_flujo(
+    inv_inicial,
+    costo_inicial,
+    cuotas_inicial,
+    importe_inicial,
+    meses_sin_cobros_inicial,
+    cuotas_regulacion_inicial,
+    importe_regulacion_inicial,
+    pct_distribucion_inicial,
+    no_cobro_inicial,
+    ops_inicial,
+    meses_demora_inicial,
+    reinversiones_compra,
+    reinversiones_colocacion,
+    pago_mensual,
+    meses_pago,
+    meses_total,
+    exacto=False,
+    curvas=None
+):
+    """Generar el flujo de caja basado en parámetros de entrada.
+
+    Con `exacto=True` todas las columnas son enteros (int64) en guaraníes y
+    Ingresos + No Cobro cuadran con el importe bruto de cada cuota.
+    `curvas` reemplaza el % No Cobro plano por curvas de mora según la edad
+    de cada cuota (ver no_cobro_celdas).
+    """
+    parametros = {
+        "inv_inicial": inv_inicial,
+        "costo_inicial": costo_inicial,
+        "cuotas_inicial": cuotas_inicial,
+        "importe_inicial": importe_inicial,
+        "meses_sin_cobros_inicial": meses_sin_cobros_inicial,
+        "cuotas_regulacion_inicial": cuotas_regulacion_inicial,
+        "importe_regulacion_inicial": importe_regulacion_inicial,
+        "pct_distribucion_inicial": pct_distribucion_inicial,
+        "no_cobro_inicial": no_cobro_inicial,
+        "ops_inicial": ops_inicial,
+        "meses_demora_inicial": meses_demora_inicial,
+        "reinversiones_compra": reinversiones_compra,
+        "reinversiones_colocacion": reinversiones_colocacion,
+        "pago_mensual": pago_mensual,
+        "meses_pago": meses_pago,
+        "meses_total": meses_total,
+        "exacto": exacto,
+        "curvas": curvas,
+    }
+    return pd.DataFrame(calcular_flujo_array(parametros), columns=COLUMNAS_FLUJO)
+
+
+@medir_tiempo(GENERAR_FLUJO_SEGUNDOS, calculo="estres")
+def calcular_flujos_estres(parametros, escenarios):
+    """Evaluar varios escenarios de estrés sobre el mismo conjunto de cohortes.
+
+    `escenarios` asocia cada nombre con su lista de shocks (ver aplicar_estres).
+    Las cohortes y sus cuotas se expanden una sola vez. Devuelve un arreglo
+    escenarios × meses × columnas en el orden de `escenarios`.
+    """
+    cohortes = construir_cohortes(parametros)
+    celdas = _expandir_parametros(parametros, cohortes)
+    no_cobro = no_cobro_celdas(cohortes, celdas, parametros.get("curvas"))
+    return np.stack([
+        _flujo_array(parametros, cohortes, celdas, *aplicar_estres(cohortes, celdas, shocks, no_cobro))
+        for shocks in escenarios.values()
+    ])
+
+
+def generar_flujos_estres(parametros, escenarios):
+    """Igual que calcular_flujos_estres, pero con un DataFrame por escenario"""
+    flujos = calcular_flujos_estres(parametros, escenarios)
+    return {
+        nombre: pd.DataFrame(flujo, columns=COLUMNAS_FLUJO)
+        for nombre, flujo in zip(escenarios, flujos)
+    }
+
+
+def _etiquetas_cohortes(parametros, cohortes):
+    """Tabla descriptiva de las cohortes, en el orden de construir_cohortes"""
+    tipo = cohortes["tipo"]
+    n_compra = len(parametros["reinversiones_compra"])
+    # Posición de cada reinversión dentro de su propia lista (desde 1)
+    numero = np.arange(len(tipo)) - np.where(tipo == TIPO_COLOCACION, n_compra, 0)
+    etiquetas = pd.DataFrame({
+        "Tipo": np.array(TIPOS_COHORTE)[tipo],
+        "Número": numero,
+        "Mes Inversión": cohortes["mes"],
+        "Origen": np.where(cohortes["automatica"], "Automática", "Manual"),
+    })
+    etiquetas.loc[tipo == TIPO_INICIAL, "Origen"] = ""
+    return etiquetas
+
+
+@medir_tiempo(GENERAR_FLUJO_SEGUNDOS, calculo="contribuciones")
+def calcular_contribuciones(parametros, shocks=None):
+    """Matriz dispersa cohorte × mes con los Ingresos y el No Cobro de cada cohorte.
+
+    Se arma directamente desde las cuotas, en formato CSR: `indptr` (una
+    entrada por cohorte + 1), `indices` (mes de cada valor) y los valores
+    `ingresos` y `no_cobro`, con las celdas de un mismo mes ya sumadas. La
+    memoria crece con la cantidad de cuotas, no con cohortes × meses. Las
+    filas siguen el orden de construir_cohortes y se describen en `cohortes`.
+    """
+    meses_total = parametros["meses_total"]
+    cohortes = construir_cohortes(parametros)
+    celdas = _expandir_parametros(parametros, cohortes)
+    mes, no_cobro, pct_distribucion = aplicar_estres(
+        cohortes, celdas, shocks or [], no_cobro_celdas(cohortes, celdas, parametros.get("curvas"))
+    )
+    if parametros.get("exacto", False):
+        ingreso, perdido = _montos_celdas_exactos(cohortes, celdas, no_cobro, pct_distribucion)
+    else:
+        ingreso, perdido = _montos_celdas(cohortes, celdas, no_cobro, pct_distribucion)
+
+    dentro = mes < meses_total
+    clave = celdas["cohorte"][dentro] * meses_total + mes[dentro]
+    orden = np.argsort(clave, kind="stable")
+    claves, inicios = np.unique(clave[orden], return_index=True)
+    n_cohortes = len(cohortes["tipo"])
+
+    if len(claves):
+        ingresos = np.add.reduceat(ingreso[dentro][orden], inicios)
+        no_cobro_total = np.add.reduceat(perdido[dentro][orden], inicios)
+    else:
+        ingresos = no_cobro_total = np.zeros(0, dtype=ingreso.dtype)
+
+    return {
+        "forma": (n_cohortes, meses_total),
+        "indptr": np.r_[0, np.bincount(claves // meses_total, minlength=n_cohortes).cumsum()],
+        "indices": claves % meses_total,
+        "ingresos": ingresos,
+        "no_cobro": no_cobro_total,
+        "cohortes": _etiquetas_cohortes(parametros, cohortes),
+    }
+
+
+def top_contribuciones_mes(contribuciones, mes, n=10):
+    """Cohortes que más aportan a los Ingresos y al No Cobro de un mes"""
+    indptr = contribuciones["indptr"]
+    filas = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    del_mes = np.flatnonzero(contribuciones["indices"] == mes)
+
+    top = contribuciones["cohortes"].iloc[filas[del_mes]].copy()
+    top["Ingresos"] = contribuciones["ingresos"][del_mes]
+    top["No Cobro"] = contribuciones["no_cobro"][del_mes]
+    total = top["Ingresos"].sum()
+    top["% Ingresos Mes"] = top["Ingresos"] / total * 100 if total else 0.0
+    return top.sort_values(["Ingresos", "No Cobro"], ascending=False).head(n)
+
+
+def contribuciones_a_csv(contribuciones):
+    """Exportar la matriz en formato largo: una fila por cohorte y mes con cobros"""
+    indptr = contribuciones["indptr"]
+    filas = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    largo = contribuciones["cohortes"].iloc[filas].reset_index(names="Cohorte")
+    largo["Mes"] = contribuciones["indices"]
+    largo["Ingresos"] = contribuciones["ingresos"]
+    largo["No Cobro"] = contribuciones["no_cobro"]
+    return largo.to_csv(index=False)
+
+
+def guardar_contribuciones_npz(contribuciones, archivo):
+    """Guardar la matriz de Ingresos con el formato de scipy.sparse.save_npz.
+
+    scipy.sparse.load_npz la lee como csr_matrix; el No Cobro va en la clave
+    adicional `no_cobro`, con los mismos `indptr` e `indices`.
+    """
+    np.savez_compressed(
+        archivo,
+        format=np.array(b"csr"),
+        shape=np.array(contribuciones["forma"]),
+        indptr=contribuciones["indptr"],
+        indices=contribuciones["indices"],
+        data=contribuciones["ingresos"],
+        no_cobro=contribuciones["no_cobro"],
+    )
+
+
+# Función para calcular reinversiones automáticas
+def calcular_reinversiones_automaticas(
+    parametros_flujo,
+    inversion_colocacion,
+    costo_op_colocacion,
+    cuotas_colocacion,
+    importe_colocacion,
+    meses_sin_cobros_colocacion,
+    cuotas_regulacion_colocacion,
+    importe_regulacion_colocacion,
+    pct_distribucion_colocacion,
+    no_cobro_colocacion,
+    meses_demora_colocacion,
+    max_reinversiones=100000,
+    piso_caja=0
+):
+    """Calcular las reinversiones Colocación automáticas que caben en el flujo.
+
+    `parametros_flujo` son los argumentos de generar_flujo con las reinversiones
+    actuales; no se modifican. Devuelve la lista de reinversiones nuevas.
+    Cada reinversión debe dejar al menos `piso_caja` de Total Disponible en su
+    mes. Como los cobros de cada reinversión financian las siguientes, la
+    cantidad puede crecer exponencialmente con el horizonte; se corta con
+    ValueError al superar `max_reinversiones`. El bucle mes a mes corre en el
+    backend de fcf_kernels.
+    """
+    # Sin inversión por reinversión el bucle nunca terminaría
+    if inversion_colocacion <= 0:
+        return []
+
+    # Costo por reinversión y operaciones que se generan
+    ops_por_reinversion = calcular_operaciones(inversion_colocacion, costo_op_colocacion)
+
+    def nueva_reinversion(mes):
+        return crear_reinversion(
+            mes,
+            inversion_colocacion,
+            cuotas_colocacion,
+            importe_colocacion,
+            meses_sin_cobros_colocacion,
+            cuotas_regulacion_colocacion,
+            importe_regulacion_colocacion,
+            pct_distribucion_colocacion,
+            no_cobro_colocacion,
+            ops_por_reinversion,
+            meses_demora_colocacion,
+            automatica=True  # Marcar como automática
+        )
+
+    # Efecto de una reinversión hecha en el mes 0 sobre el Total Disponible;
+    # una reinversión en el mes m desplaza ese efecto m meses
+    plantilla = dict(
+        parametros_flujo,
+        inv_inicial=0, cuotas_inicial=0, cuotas_regulacion_inicial=0,
+        pago_mensual=0, reinversiones_compra=[], reinversiones_colocacion=[nueva_reinversion(0)]
+    )
+    efecto = calcular_flujo_array(plantilla)[:, _COL["Total Disponible"]]
+    if efecto[0] >= 0:
+        raise ValueError(
+            "La reinversión automática no reduce el disponible de su propio mes; "
+            "revise la inversión y el importe de Colocación"
+        )
+
+    disponible = calcular_flujo_array(parametros_flujo)[:, _COL["Total Disponible"]]
+
+    # Recorrer los meses desde el 1 agregando reinversiones mientras haya fondos
+    meses, _ = reinversion_automatica(
+        disponible, efecto, inversion_colocacion, piso_caja, max_reinversiones
+    )
+    return [nueva_reinversion(mes) for mes in meses.tolist()]
+
+
+def _kpis_arrays(flujos):
+    """Reducciones de KPI sobre un arreglo escenarios × meses × columnas"""
+    saldo = flujos[:, :, _COL["Saldo Acumulado"]]
+    ops = flujos[:, :, _COL["Operaciones Abiertas"]]
+    positivo = saldo > 0
+    mes_saldo_minimo = saldo.argmin(axis=1)
+    mes_max_operaciones = ops.argmax(axis=1)
+    filas = np.arange(len(flujos))
+
+    return {
+        # -1 si el saldo nunca llega a ser positivo
+        "mes_equilibrio": np.where(positivo.any(axis=1), positivo.argmax(axis=1), -1),
+        "saldo_minimo": saldo[filas, mes_saldo_minimo],
+        "mes_saldo_minimo": mes_saldo_minimo,
+        "saldo_final": saldo[:, -1],
+        "max_operaciones_abiertas": ops[filas, mes_max_operaciones],
+        "mes_max_operaciones": mes_max_operaciones,
+        "total_ingresos": flujos[:, :, _COL["Ingresos"]].sum(axis=1),
+        "total_no_cobro": flujos[:, :, _COL["No Cobro"]].sum(axis=1),
+    }
+
+
+def calcular_kpis(flujo_caja):
+    """Calcular los indicadores principales de un flujo de caja"""
+    kpis = _kpis_arrays(flujo_caja[COLUMNAS_FLUJO].to_numpy()[None])
+    # .item() conserva enteros en el modo exacto
+    resultado = {nombre: valores[0].item() for nombre, valores in kpis.items()}
+    if resultado["mes_equilibrio"] < 0:
+        resultado["mes_equilibrio"] = None
+    return resultado
+
+
+def calcular_kpis_lote(flujos, nombres=None):
+    """KPIs de muchos escenarios a la vez, con una fila por escenario.
+
+    `flujos` es un arreglo escenarios × meses × columnas (por ejemplo el de
+    calcular_flujos_estres). mes_equilibrio queda vacío si el saldo nunca
+    llega a ser positivo.
+    """
+    kpis = pd.DataFrame(_kpis_arrays(np.asarray(flujos)), index=nombres)
+    kpis["mes_equilibrio"] = kpis["mes_equilibrio"].astype("Int64").mask(kpis["mes_equilibrio"] < 0)
+    return kpis
+
+
+def calcular_kpis_escenarios(lista_parametros):
+    """KPIs de una lista de juegos de parámetros de generar_flujo.
+
+    Los flujos se calculan como arreglos, sin armar un DataFrame por
+    escenario, y se reducen juntos los que comparten meses_total y modo
+    exacto. Las filas siguen el orden de `lista_parametros`; si se mezclan
+    modos, las columnas quedan como object para no perder los enteros.
+    """
+    if not lista_parametros:
+        # Sin escenarios: las mismas columnas, sin filas
+        return calcular_kpis_lote(np.zeros((0, 1, len(COLUMNAS_FLUJO))))
+
+    flujos = [calcular_flujo_array(parametros) for parametros in lista_parametros]
+
+    grupos = {}
+    for i, (parametros, flujo) in enumerate(zip(lista_parametros, flujos)):
+        grupos.setdefault((len(flujo), bool(parametros.get("exacto", False))), []).append(i)
+
+    partes = [
+        calcular_kpis_lote(np.stack([flujos[i] for i in indices]), nombres=indices)
+        for indices in grupos.values()
+    ]
+    if len({exacto for _, exacto in grupos}) > 1:
+        partes = [parte.astype(object) for parte in partes]
+    return pd.concat(partes).sort_index()
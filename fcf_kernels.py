@@ -0,0 +1,156 @@
+"""Núcleos secuenciales del motor con backend acelerado opcional.
+
+Algunos cálculos no se pueden vectorizar porque cada mes depende de las
+decisiones del anterior (la reinversión automática con su piso de caja).
+Si numba está instalado se compilan como bucles nativos; si no, se usa una
+versión NumPy. Ambos backends hacen las mismas operaciones en el mismo
+orden y dan resultados idénticos.
+
+El backend se elige con la variable de entorno FCF_BACKEND (auto, numba o
+numpy; auto por defecto) o con usar_backend(). Para ver cuál está activo:
+
+    python -m fcf_kernels
+"""
+import importlib.util
+import os
+import time
+
+# numpy se importa en las funciones y numba recién al compilar el primer
+# núcleo: importarlos tarda más que arrancar la app
+NUMBA_DISPONIBLE = importlib.util.find_spec("numba") is not None
+
+BACKENDS = ["auto", "numba", "numpy"]
+
+_backend = None
+_reinversion_automatica_numba = None
+
+
+def usar_backend(nombre):
+    """Fijar el backend: "numba" falla si numba no está instalado"""
+    global _backend
+    if nombre not in BACKENDS:
+        raise ValueError(f"Backend desconocido: {nombre!r} (opciones: {', '.join(BACKENDS)})")
+    if nombre == "numba" and not NUMBA_DISPONIBLE:
+        raise ImportError("Se pidió el backend numba, pero numba no está instalado")
+    _backend = "numba" if nombre == "numba" or (nombre == "auto" and NUMBA_DISPONIBLE) else "numpy"
+    return _backend
+
+
+def backend_activo():
+    """Backend en uso ("numba" o "numpy"); la primera vez se lee FCF_BACKEND"""
+    if _backend is None:
+        usar_backend(os.environ.get("FCF_BACKEND", "auto").strip().lower() or "auto")
+    return _backend
+
+
+def _reinversion_automatica_bucle(disponible, efecto, inversion, piso, meses):
+    """Bucle escalar de la reinversión automática (fuente del núcleo numba).
+
+    Modifica `disponible` y escribe en `meses` el mes de cada reinversión.
+    Devuelve la cantidad de reinversiones, o -(mes + 1) si `meses` se llenó
+    en ese mes.
+    """
+    meses_total = disponible.shape[0]
+    n = 0
+    for mes in range(1, meses_total):
+        while disponible[mes] - inversion >= piso:
+            if n >= meses.shape[0]:
+                return -(mes + 1)
+            meses[n] = mes
+            n += 1
+            for k in range(mes, meses_total):
+                disponible[k] += efecto[k - mes]
+    return n
+
+
+def _reinversion_automatica_numpy(disponible, efecto, inversion, piso, meses):
+    """Mismo cálculo que _reinversion_automatica_bucle, sumando por tramos"""
+    meses_total = len(disponible)
+    n = 0
+    for mes in range(1, meses_total):
+        while disponible[mes] - inversion >= piso:
+            if n >= len(meses):
+                return -(mes + 1)
+            meses[n] = mes
+            n += 1
+            disponible[mes:] += efecto[:meses_total - mes]
+    return n
+
+
+def _nucleo_reinversion_automatica():
+    global _reinversion_automatica_numba
+    if backend_activo() == "numpy":
+        return _reinversion_automatica_numpy
+    if _reinversion_automatica_numba is None:
+        import numba
+
+        # Sin fastmath: las sumas deben coincidir bit a bit con NumPy
+        _reinversion_automatica_numba = numba.njit(cache=True, nogil=True)(_reinversion_automatica_bucle)
+    return _reinversion_automatica_numba
+
+
+def reinversion_automatica(disponible, efecto, inversion, piso=0, max_reinversiones=100000):
+    """Meses de las reinversiones automáticas que caben en `disponible`.
+
+    Desde el mes 1, mientras el disponible del mes menos `inversion` no baje
+    de `piso`, se agrega una reinversión y se suma `efecto` (su impacto en el
+    disponible, desde su propio mes) a los meses siguientes. Devuelve
+    (meses, disponible final). Si se superan `max_reinversiones`, lanza
+    ValueError.
+    """
+    import numpy as np
+
+    disponible = np.array(disponible)
+    efecto = np.asarray(efecto, dtype=disponible.dtype)
+    # Comparar en el tipo del arreglo (enteros en el modo exacto)
+    inversion = disponible.dtype.type(inversion)
+    piso = disponible.dtype.type(piso)
+    meses = np.empty(max_reinversiones, dtype=np.int64)
+
+    n = _nucleo_reinversion_automatica()(disponible, efecto, inversion, piso, meses)
+    if n < 0:
+        raise ValueError(
+            f"La reinversión automática supera {max_reinversiones} reinversiones "
+            f"(mes {-n - 1}); reduzca los meses a proyectar"
+        )
+    return meses[:n], disponible
+
+
+def _verificar():
+    """Comparar los backends disponibles sobre un caso de prueba y medir su tiempo"""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    meses_total = 360
+    efecto = np.cumsum(rng.integers(0, 400000, meses_total)).astype(float) - 6000000
+    disponible = np.cumsum(rng.integers(-100000, 900000, meses_total)).astype(float)
+
+    resultados = {}
+    backend_original = backend_activo()
+    for nombre in ["numpy"] + (["numba"] if NUMBA_DISPONIBLE else []):
+        usar_backend(nombre)
+        reinversion_automatica(disponible[:24], efecto[:24], 6000000, 1000000)  # compilar
+        inicio = time.perf_counter()
+        meses, final = reinversion_automatica(disponible, efecto, 6000000, 1000000, 10 ** 7)
+        resultados[nombre] = (meses, final, time.perf_counter() - inicio)
+    usar_backend(backend_original)
+
+    print(f"Backend activo: {backend_original}")
+    if NUMBA_DISPONIBLE:
+        import numba
+        print(f"numba: {numba.__version__}")
+    else:
+        print("numba: no instalado")
+    for nombre, (meses, _, segundos) in resultados.items():
+        print(f"  {nombre:<6} {len(meses)} reinversiones en {segundos * 1000:.1f} ms")
+    if "numba" in resultados:
+        iguales = all(
+            np.array_equal(a, b) for a, b in zip(resultados["numpy"][:2], resultados["numba"][:2])
+        )
+        print(f"Resultados idénticos entre backends: {'sí' if iguales else 'NO'}")
+        return 0 if iguales else 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_verificar())
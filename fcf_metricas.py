@@ -0,0 +1,319 @@
+"""Métricas de operación de la calculadora en formato de texto de Prometheus.
+
+Contadores, histogramas y medidores en memoria del proceso, seguros entre
+hilos (el servidor de Streamlit corre cada sesión en su propio hilo). Se
+exponen según variables de entorno:
+
+    FCF_METRICAS_PUERTO      sirve GET /metrics en 127.0.0.1:<puerto>
+    FCF_METRICAS_ARCHIVO     reescribe el archivo cada FCF_METRICAS_INTERVALO
+                             segundos (15 por defecto) y al salir
+    FCF_METRICAS_TTL_SESION  segundos sin actividad tras los que se descartan
+                             los medidores de una sesión (3600 por defecto)
+"""
+import atexit
+import bisect
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+_log = logging.getLogger(__name__)
+
+# Límites (en segundos) de los histogramas de latencia
+LIMITES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _leer_segundos(variable, defecto):
+    """Segundos configurados en `variable`; si no son un número válido, `defecto`"""
+    valor = os.environ.get(variable)
+    if valor is None:
+        return defecto
+    try:
+        segundos = float(valor)
+    except ValueError:
+        segundos = -1
+    if segundos <= 0:
+        _log.warning("%s=%r no es una cantidad de segundos válida; se usa %s", variable, valor, defecto)
+        return defecto
+    return segundos
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _etiquetas_texto(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in pares) + "}"
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nombre, ayuda):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def _clave(self, etiquetas):
+        return tuple(sorted(etiquetas.items()))
+
+    def texto(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        with self._lock:
+            lineas += self._lineas()
+        return "\n".join(lineas)
+
+
+class Contador(_Metrica):
+    """Valor que solo crece (eventos, iteraciones)"""
+
+    tipo = "counter"
+
+    def incrementar(self, valor=1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def _lineas(self):
+        return [f"{self.nombre}{_etiquetas_texto(k)} {_numero(v)}" for k, v in self._valores.items()]
+
+
+class Medidor(_Metrica):
+    """Valor que sube y baja; con `ttl` se descartan las etiquetas sin actualizar"""
+
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, ttl=None):
+        super().__init__(nombre, ayuda)
+        self.ttl = ttl
+
+    def fijar(self, valor, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = (valor, time.monotonic())
+
+    def _lineas(self):
+        if self.ttl is not None:
+            limite = time.monotonic() - self.ttl
+            self._valores = {k: v for k, v in self._valores.items() if v[1] >= limite}
+        return [f"{self.nombre}{_etiquetas_texto(k)} {_numero(v)}" for k, (v, _) in self._valores.items()]
+
+
+class Histograma(_Metrica):
+    """Distribución de valores en baldes acumulados"""
+
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, limites=LIMITES_LATENCIA):
+        super().__init__(nombre, ayuda)
+        self.limites = tuple(sorted(limites))
+
+    def observar(self, valor, **etiquetas):
+        clave = self._clave(etiquetas)
+        balde = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            datos = self._valores.get(clave)
+            if datos is None:
+                datos = self._valores[clave] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            datos[0][balde] += 1
+            datos[1] += valor
+            datos[2] += 1
+
+    def _lineas(self):
+        lineas = []
+        for clave, (baldes, suma, cuenta) in self._valores.items():
+            acumulado = 0
+            for limite, n in zip(self.limites + (float("inf"),), baldes):
+                acumulado += n
+                lineas.append(
+                    f"{self.nombre}_bucket{_etiquetas_texto(clave, [('le', _numero(limite))])} {acumulado}"
+                )
+            lineas.append(f"{self.nombre}_sum{_etiquetas_texto(clave)} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{_etiquetas_texto(clave)} {cuenta}")
+        return lineas
+
+
+class Registro:
+    """Conjunto de métricas que se exportan juntas"""
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica):
+        with self._lock:
+            return self._metricas.setdefault(metrica.nombre, metrica)
+
+    def contador(self, nombre, ayuda):
+        return self._registrar(Contador(nombre, ayuda))
+
+    def medidor(self, nombre, ayuda, ttl=None):
+        return self._registrar(Medidor(nombre, ayuda, ttl))
+
+    def histograma(self, nombre, ayuda, limites=LIMITES_LATENCIA):
+        return self._registrar(Histograma(nombre, ayuda, limites))
+
+    def texto(self):
+        """Todas las métricas en el formato de exposición de texto de Prometheus"""
+        with self._lock:
+            metricas = list(self._metricas.values())
+        return "\n".join(m.texto() for m in metricas) + "\n"
+
+
+REGISTRO = Registro()
+
+# Métricas de la aplicación
+RERUNS = REGISTRO.contador("fcf_reruns_total", "Ejecuciones del script de la aplicación")
+GENERAR_FLUJO_SEGUNDOS = REGISTRO.histograma(
+    "fcf_generar_flujo_segundos",
+    "Duración de los cálculos de flujo del motor (generar_flujo, reinversión automática, estrés, contribuciones)"
+)
+REINVERSION_AUTOMATICA = REGISTRO.contador(
+    "fcf_reinversion_automatica_total", "Ejecuciones de la reinversión automática"
+)
+REINVERSIONES_AUTOMATICAS_AGREGADAS = REGISTRO.contador(
+    "fcf_reinversiones_automaticas_agregadas_total",
+    "Reinversiones agregadas por la reinversión automática (iteraciones del bucle)"
+)
+REINVERSION_AUTOMATICA_SEGUNDOS = REGISTRO.histograma(
+    "fcf_reinversion_automatica_segundos", "Duración de la reinversión automática"
+)
+_TTL_SESION = _leer_segundos("FCF_METRICAS_TTL_SESION", 3600)
+REINVERSIONES_SESION = REGISTRO.medidor(
+    "fcf_sesion_reinversiones", "Reinversiones guardadas en cada sesión", ttl=_TTL_SESION
+)
+REINVERSIONES_SESION_BYTES = REGISTRO.medidor(
+    "fcf_sesion_reinversiones_bytes", "Memoria estimada de las reinversiones de cada sesión", ttl=_TTL_SESION
+)
+
+# Métricas de la API
+API_SOLICITUDES = REGISTRO.contador("fcf_api_solicitudes_total", "Solicitudes atendidas por la API")
+API_SEGUNDOS = REGISTRO.histograma("fcf_api_segundos", "Duración de las solicitudes a la API")
+
+
+@contextmanager
+def medir_tiempo(histograma, **etiquetas):
+    """Observar en `histograma` la duración del bloque (o de cada llamada, como decorador)"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        histograma.observar(time.perf_counter() - inicio, **etiquetas)
+
+
+def id_sesion():
+    """Id de la sesión de Streamlit que corre el script ("local" fuera de Streamlit)"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return "local"
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else "local"
+
+
+def bytes_reinversiones(reinversiones):
+    """Memoria aproximada de una lista de reinversiones.
+
+    Todas tienen las mismas claves y valores escalares, así que se mide la
+    primera y se multiplica, sin recorrer la lista.
+    """
+    if not reinversiones:
+        return sys.getsizeof(reinversiones)
+    muestra = reinversiones[0]
+    por_reinversion = sys.getsizeof(muestra) + sum(sys.getsizeof(v) for v in muestra.values())
+    return sys.getsizeof(reinversiones) + len(reinversiones) * por_reinversion
+
+
+def registrar_sesion(reinversiones_compra, reinversiones_colocacion):
+    """Actualizar los medidores de tamaño de la sesión actual"""
+    sesion = id_sesion()
+    for tipo, lista in (("compra", reinversiones_compra), ("colocacion", reinversiones_colocacion)):
+        REINVERSIONES_SESION.fijar(len(lista), sesion=sesion, tipo=tipo)
+        REINVERSIONES_SESION_BYTES.fijar(bytes_reinversiones(lista), sesion=sesion, tipo=tipo)
+
+
+def _iniciar_servidor_http(puerto):
+    """Servir GET /metrics en 127.0.0.1:<puerto> desde un hilo de fondo"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class ManejadorMetricas(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            datos = REGISTRO.texto().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+
+        def log_message(self, format, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", puerto), ManejadorMetricas)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="fcf-metricas-http", daemon=True).start()
+
+
+def guardar_metricas(archivo):
+    """Escribir las métricas en `archivo` de forma atómica"""
+    temporal = f"{archivo}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        f.write(REGISTRO.texto())
+    os.replace(temporal, archivo)
+
+
+_exportador_iniciado = False
+_lock_exportador = threading.Lock()
+
+
+def iniciar_exportador():
+    """Iniciar una sola vez por proceso la exportación configurada por entorno.
+
+    Se puede llamar en cada rerun: las llamadas siguientes no hacen nada.
+    Una configuración inválida (puerto no numérico u ocupado) solo deja un
+    aviso en el log: las métricas no deben impedir que cargue la página.
+    """
+    global _exportador_iniciado
+    with _lock_exportador:
+        if _exportador_iniciado:
+            return
+        _exportador_iniciado = True
+
+    puerto = os.environ.get("FCF_METRICAS_PUERTO")
+    if puerto:
+        try:
+            _iniciar_servidor_http(int(puerto))
+        except (OSError, ValueError, OverflowError) as e:
+            _log.warning("No se pudo servir las métricas en FCF_METRICAS_PUERTO=%r: %s", puerto, e)
+
+    archivo = os.environ.get("FCF_METRICAS_ARCHIVO")
+    if archivo:
+        intervalo = _leer_segundos("FCF_METRICAS_INTERVALO", 15)
+
+        def guardar():
+            try:
+                guardar_metricas(archivo)
+            except OSError as e:
+                _log.warning("No se pudo escribir FCF_METRICAS_ARCHIVO=%r: %s", archivo, e)
+
+        def escribir_periodicamente():
+            while True:
+                guardar()
+                time.sleep(intervalo)
+
+        threading.Thread(target=escribir_periodicamente, name="fcf-metricas-archivo", daemon=True).start()
+        atexit.register(guardar)
@@ -0,0 +1,410 @@
+"""Verificación aleatoria del motor contra la semántica original.
+
+Uso:
+    python fcf_verificacion.py --casos 100 --semilla 0
+    python fcf_verificacion.py --rendimiento
+
+Genera parámetros al azar y compara el motor vectorizado con una versión de
+referencia que recorre cuota por cuota, como lo hacía el cálculo original:
+
+    flujo                  generar_flujo contra el bucle por cuota
+    estres                 calcular_flujos_estres contra el bucle con los
+                           shocks aplicados a cada cuota
+    reinversion_automatica calcular_reinversiones_automaticas contra el bucle
+                           original, que regenera el flujo en cada reinversión
+    exacto                 el modo exacto en enteros: el bruto y el No Cobro de
+                           cada cohorte suman exactamente su total redondeado
+
+Con --rendimiento, además, mide calcular_flujo_array en modo exacto y en
+punto flotante sobre un caso fijo grande (2000 reinversiones, 360 meses) e
+informa el cociente entre ambos tiempos.
+
+Devuelve 1 si alguna comparación falla.
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from fcf_engine import (
+    COLUMNAS_FLUJO,
+    ESCALA_EXACTA,
+    TIPOS_COHORTE,
+    _expandir_parametros,
+    _montos_celdas_exactos,
+    _redondear_con_residuo,
+    aplicar_estres,
+    calcular_flujo_array,
+    calcular_flujos_estres,
+    calcular_operaciones,
+    calcular_reinversiones_automaticas,
+    construir_cohortes,
+    crear_reinversion,
+    generar_flujo,
+)
+
+# Diferencia relativa admitida entre sumas de punto flotante en distinto orden
+TOLERANCIA = 1e-9
+
+_COL = {nombre: i for i, nombre in enumerate(COLUMNAS_FLUJO)}
+
+
+def _reinversion_aleatoria(rng, automatica=False):
+    return dict(
+        mes=rng.randint(1, 60),
+        inversion=rng.choice([3000000, 6000000, 12000000]),
+        cuotas=rng.randint(1, 30),
+        importe=rng.choice([800000, 1500000, 2000000]),
+        meses_sin_cobros=rng.randint(0, 8),
+        cuotas_regulacion=rng.randint(0, 6),
+        importe_regulacion=rng.choice([0, 500000, 700000]),
+        pct_distribucion=rng.choice([20, 40, 60, 80]),
+        no_cobro=rng.choice([0.0, 2.5, 10.0, 33.5]),
+        ops=rng.randint(0, 5),
+        meses_demora=rng.randint(0, 4),
+        automatica=automatica,
+    )
+
+
+def caso_aleatorio(rng):
+    """Argumentos de generar_flujo elegidos al azar con `rng` (random.Random)"""
+    return dict(
+        inv_inicial=300000000,
+        costo_inicial=6000000,
+        cuotas_inicial=rng.randint(1, 30),
+        importe_inicial=1500000,
+        meses_sin_cobros_inicial=rng.randint(0, 6),
+        cuotas_regulacion_inicial=rng.randint(0, 6),
+        importe_regulacion_inicial=500000,
+        pct_distribucion_inicial=rng.choice([20, 40, 60, 80]),
+        no_cobro_inicial=rng.choice([0.0, 1.5, 7.0]),
+        ops_inicial=50,
+        meses_demora_inicial=rng.randint(0, 5),
+        reinversiones_compra=[_reinversion_aleatoria(rng) for _ in range(rng.randint(0, 8))],
+        reinversiones_colocacion=[
+            _reinversion_aleatoria(rng, rng.random() < 0.5) for _ in range(rng.randint(0, 8))
+        ],
+        pago_mensual=5000000,
+        meses_pago=rng.randint(1, 120),
+        meses_total=rng.choice([12, 36, 100, 200]),
+    )
+
+
+def shocks_aleatorios(rng, meses_total):
+    """Lista de shocks de estrés al azar (ver aplicar_estres)"""
+    shocks = []
+    for _ in range(rng.randint(1, 4)):
+        desde = rng.randint(0, meses_total - 1)
+        shock = {
+            "tipo": rng.choice(["no_cobro", "demora", "pct_distribucion"]),
+            "desde": desde,
+            "hasta": rng.choice([None, desde + rng.randint(0, 24)]),
+        }
+        shock["valor"] = {
+            "no_cobro": rng.choice([-5.0, 2.5, 15.0, 80.0]),
+            "demora": rng.randint(0, 6),
+            "pct_distribucion": rng.choice([0, 25, 50, 100]),
+        }[shock["tipo"]]
+        if rng.random() < 0.5:
+            shock["aplica_a"] = rng.sample(TIPOS_COHORTE, rng.randint(1, 2))
+        shocks.append(shock)
+    return shocks
+
+
+def _cuotas_referencia(p):
+    """Cuotas de cada cohorte como en el cálculo original:
+    (tipo, mes de cobro, regulación, ops, monto de la cuota, % No Cobro)"""
+    meses_total = p["meses_total"]
+    cuotas = []
+    inicio_regulacion = p["meses_demora_inicial"] + p["cuotas_inicial"] + p["meses_sin_cobros_inicial"]
+    for i in range(min(p["cuotas_inicial"], meses_total - 1)):
+        cuotas.append(("Inicial", i + 1 + p["meses_demora_inicial"], False, p["ops_inicial"],
+                       p["importe_inicial"], p["no_cobro_inicial"]))
+    for i in range(min(p["cuotas_regulacion_inicial"], meses_total - inicio_regulacion)):
+        cuotas.append(("Inicial", inicio_regulacion + i, True, p["ops_inicial"],
+                       p["importe_regulacion_inicial"], p["no_cobro_inicial"], p["pct_distribucion_inicial"]))
+
+    for tipo, lista in (("Compra", p["reinversiones_compra"]), ("Colocación", p["reinversiones_colocacion"])):
+        for r in lista:
+            for i in range(min(r["cuotas"], meses_total - r["mes"] - r["meses_demora"])):
+                cuotas.append((tipo, r["mes"] + i + r["meses_demora"], False, r["ops"],
+                               r["importe"], r["no_cobro"]))
+            inicio = r["mes"] + r["meses_demora"] + r["cuotas"] + r["meses_sin_cobros"]
+            for i in range(min(r["cuotas_regulacion"], meses_total - inicio)):
+                cuotas.append((tipo, inicio + i, True, r["ops"],
+                               r["importe_regulacion"], r["no_cobro"], r["pct_distribucion"]))
+    return cuotas
+
+
+def _afecta(shock, tipo, mes):
+    return (
+        mes >= shock["desde"] and
+        (shock.get("hasta") is None or mes <= shock["hasta"]) and
+        (not shock.get("aplica_a") or tipo in shock["aplica_a"])
+    )
+
+
+def flujo_referencia(p, shocks=()):
+    """Flujo de caja recorriendo cuota por cuota, con los shocks de cada una.
+
+    Las demoras se aplican primero y en orden; los demás shocks se evalúan
+    sobre el mes ya demorado, como en aplicar_estres.
+    """
+    meses_total = p["meses_total"]
+    flujo = np.zeros((meses_total, len(COLUMNAS_FLUJO)))
+    demoras = [s for s in shocks if s["tipo"] == "demora"]
+    otros = [s for s in shocks if s["tipo"] != "demora"]
+
+    for tipo, mes, regulacion, ops, monto, no_cobro, *pct in _cuotas_referencia(p):
+        pct_distribucion = pct[0] if regulacion else None
+        for shock in demoras:
+            if _afecta(shock, tipo, mes):
+                mes += int(shock["valor"])
+        for shock in otros:
+            if not _afecta(shock, tipo, mes):
+                continue
+            if shock["tipo"] == "no_cobro":
+                no_cobro += shock["valor"]
+            elif regulacion:
+                pct_distribucion = shock["valor"]
+        no_cobro = min(max(no_cobro, 0), 100)
+        if mes >= meses_total:
+            continue
+        if regulacion:
+            monto = monto * (pct_distribucion / 100)
+        flujo[mes, _COL["Ingresos"]] += ops * (monto * (1 - no_cobro / 100))
+        flujo[mes, _COL["No Cobro"]] += ops * (monto * (no_cobro / 100))
+        if not regulacion:
+            flujo[mes, _COL["Operaciones Abiertas"]] += ops
+
+    for lista in (p["reinversiones_compra"], p["reinversiones_colocacion"]):
+        for r in lista:
+            mes_inversion = min(r["mes"], meses_total - 1)
+            flujo[mes_inversion, _COL["Reinversión"]] += r["inversion"]
+            if r.get("automatica", False) and lista is p["reinversiones_colocacion"]:
+                flujo[mes_inversion, _COL["Reinversiones Automáticas Mes"]] += 1
+
+    for mes in range(1, min(p["meses_pago"] + 1, meses_total)):
+        flujo[mes, _COL["Pago Mensual"]] = p["pago_mensual"]
+
+    total_cobrado = flujo[:, _COL["Ingresos"]].cumsum()
+    disponible = total_cobrado - flujo[:, _COL["Reinversión"]].cumsum() - flujo[:, _COL["Pago Mensual"]].cumsum()
+    flujo[:, _COL["Total Cobrado"]] = total_cobrado
+    flujo[:, _COL["Total Disponible"]] = disponible
+    flujo[:, _COL["Saldo Acumulado"]] = -p["inv_inicial"] + disponible
+    flujo[:, _COL["Reinversiones Automáticas Total"]] = flujo[:, _COL["Reinversiones Automáticas Mes"]].cumsum()
+    return flujo
+
+
+def _diferencia(a, b):
+    """Mayor diferencia absoluta y si está dentro de la tolerancia relativa"""
+    diferencia = np.abs(a - b)
+    escala = np.maximum(1.0, np.maximum(np.abs(a), np.abs(b)))
+    return float(diferencia.max(initial=0)), bool((diferencia <= TOLERANCIA * escala).all())
+
+
+def verificar_flujo(casos, semilla):
+    """generar_flujo contra el bucle por cuota"""
+    fallas, maxima = [], 0.0
+    for i in range(casos):
+        p = caso_aleatorio(random.Random(semilla + i))
+        diferencia, ok = _diferencia(generar_flujo(**p).to_numpy(), flujo_referencia(p))
+        maxima = max(maxima, diferencia)
+        if not ok:
+            fallas.append(f"flujo, semilla {semilla + i}: diferencia {diferencia}")
+    return maxima, fallas
+
+
+def verificar_estres(casos, semilla):
+    """calcular_flujos_estres contra el bucle con los shocks de cada cuota"""
+    fallas, maxima = [], 0.0
+    for i in range(casos):
+        rng = random.Random(semilla + i)
+        p = caso_aleatorio(rng)
+        escenarios = {"Base": [], "A": shocks_aleatorios(rng, p["meses_total"]),
+                      "B": shocks_aleatorios(rng, p["meses_total"])}
+        flujos = calcular_flujos_estres(p, escenarios)
+        for flujo, (nombre, shocks) in zip(flujos, escenarios.items()):
+            diferencia, ok = _diferencia(flujo, flujo_referencia(p, shocks))
+            maxima = max(maxima, diferencia)
+            if not ok:
+                fallas.append(f"estrés, semilla {semilla + i}, escenario {nombre}: diferencia {diferencia}")
+    return maxima, fallas
+
+
+def reinversiones_automaticas_referencia(p, argumentos, piso_caja=0, max_reinversiones=2000):
+    """Bucle original: regenerar el flujo tras cada reinversión agregada"""
+    inversion, costo_op, *resto = argumentos
+    ops = calcular_operaciones(inversion, costo_op)
+    cuotas, importe, meses_sin_cobros, cuotas_regulacion, importe_regulacion, pct, no_cobro, demora = resto
+    nuevas = []
+    for mes in range(1, p["meses_total"]):
+        while True:
+            q = dict(p, reinversiones_colocacion=p["reinversiones_colocacion"] + nuevas)
+            if flujo_referencia(q)[mes, _COL["Total Disponible"]] - inversion < piso_caja:
+                break
+            if len(nuevas) >= max_reinversiones:
+                return None
+            nuevas.append(crear_reinversion(
+                mes, inversion, cuotas, importe, meses_sin_cobros, cuotas_regulacion,
+                importe_regulacion, pct, no_cobro, ops, demora, automatica=True
+            ))
+    return nuevas
+
+
+def verificar_reinversion_automatica(casos, semilla):
+    """calcular_reinversiones_automaticas contra el bucle original"""
+    fallas, comparadas = [], 0
+    for i in range(casos):
+        rng = random.Random(semilla + i)
+        p = caso_aleatorio(rng)
+        # Horizonte corto: el bucle original es cuadrático en las reinversiones
+        p.update(meses_total=16, inv_inicial=20000000, ops_inicial=8, pago_mensual=1000000,
+                 reinversiones_compra=p["reinversiones_compra"][:2])
+        argumentos = (6000000, 6000000, 10, 1500000, 2, 3, 500000, 40, 2.5, rng.randint(0, 2))
+        piso_caja = rng.choice([0, 0, 1000000, 5000000])
+        esperadas = reinversiones_automaticas_referencia(p, argumentos, piso_caja)
+        if esperadas is None:
+            continue
+        nuevas = calcular_reinversiones_automaticas(p, *argumentos, piso_caja=piso_caja)
+        comparadas += 1
+        if nuevas != esperadas:
+            fallas.append(
+                f"reinversión automática, semilla {semilla + i}: "
+                f"{len(nuevas)} reinversiones, se esperaban {len(esperadas)}"
+            )
+    return comparadas, fallas
+
+
+def _redondeo_esperado(numeradores):
+    """Total de los numeradores en guaraníes, redondeado a la mitad hacia arriba"""
+    return (sum(numeradores) + ESCALA_EXACTA // 2) // ESCALA_EXACTA
+
+
+def _centesimas(porcentaje):
+    return int(round(float(porcentaje) * 100))
+
+
+def verificar_exacto(casos, semilla):
+    """Conciliación del modo exacto, calculada con enteros de Python"""
+    fallas = []
+    for i in range(casos):
+        rng = random.Random(semilla + i)
+
+        # Reparto del residuo sobre grupos al azar
+        n_grupos = rng.randint(1, 6)
+        numerador = np.array([rng.randint(0, 10 ** 12) for _ in range(rng.randint(1, 60))], dtype=np.int64)
+        grupo = np.array([rng.randrange(n_grupos) for _ in numerador], dtype=np.int64)
+        repartido = _redondear_con_residuo(numerador, grupo, n_grupos)
+        for g in range(n_grupos):
+            de_grupo = grupo == g
+            if repartido[de_grupo].sum() != _redondeo_esperado(numerador[de_grupo].tolist()):
+                fallas.append(f"exacto, semilla {semilla + i}: el grupo {g} no suma su total redondeado")
+        if ((repartido - numerador // ESCALA_EXACTA) > 1).any() or (repartido < numerador // ESCALA_EXACTA).any():
+            fallas.append(f"exacto, semilla {semilla + i}: una celda se aparta más de 1 de su cociente")
+
+        # Cohortes completas, con importes y porcentajes con decimales y estrés
+        p = caso_aleatorio(rng)
+        p["exacto"] = True
+        p["importe_inicial"] = rng.randint(1, 3000000)
+        p["importe_regulacion_inicial"] = rng.randint(0, 999999)
+        p["no_cobro_inicial"] = round(rng.uniform(0, 60), 2)
+        for r in p["reinversiones_compra"] + p["reinversiones_colocacion"]:
+            r.update(importe=rng.randint(1, 3000000), importe_regulacion=rng.randint(0, 999999),
+                     no_cobro=round(rng.uniform(0, 60), 2), ops=rng.randint(1, 7))
+        shocks = [s for s in shocks_aleatorios(rng, p["meses_total"]) if s["tipo"] != "no_cobro"]
+        shocks.append({"tipo": "no_cobro", "desde": rng.randint(0, 40), "valor": rng.choice([1.25, 7.77, 15])})
+
+        cohortes = construir_cohortes(p)
+        celdas = _expandir_parametros(p, cohortes)
+        _, no_cobro, pct_distribucion = aplicar_estres(cohortes, celdas, shocks)
+        ingreso, perdido = _montos_celdas_exactos(cohortes, celdas, no_cobro, pct_distribucion)
+        bruto = ingreso + perdido
+        for k in range(len(cohortes["tipo"])):
+            de_cohorte = np.flatnonzero(celdas["cohorte"] == k)
+            regulacion = de_cohorte[celdas["regulacion"][de_cohorte]]
+            ops = int(cohortes["ops"][k])
+            esperado_regulacion = _redondeo_esperado(
+                ops * int(cohortes["importe_regulacion"][k]) * _centesimas(pct_distribucion[j]) for j in regulacion
+            )
+            if bruto[regulacion].sum() != esperado_regulacion:
+                fallas.append(f"exacto, semilla {semilla + i}: la regulación de la cohorte {k} no cuadra")
+            esperado_no_cobro = _redondeo_esperado(
+                int(bruto[j]) * _centesimas(no_cobro[j]) for j in de_cohorte
+            )
+            if perdido[de_cohorte].sum() != esperado_no_cobro:
+                fallas.append(f"exacto, semilla {semilla + i}: el No Cobro de la cohorte {k} no cuadra")
+            if (ingreso[de_cohorte] < 0).any() or (perdido[de_cohorte] < 0).any():
+                fallas.append(f"exacto, semilla {semilla + i}: montos negativos en la cohorte {k}")
+
+        flujo = calcular_flujos_estres(p, {"Estrés": shocks})[0]
+        if flujo.dtype != np.int64 or flujo[-1, _COL["Total Cobrado"]] != flujo[:, _COL["Ingresos"]].sum():
+            fallas.append(f"exacto, semilla {semilla + i}: el flujo no es entero o no acumula sin diferencias")
+    return fallas
+
+
+def caso_rendimiento(semilla=0, reinversiones=2000, meses_total=360):
+    """Caso grande y fijo para medir: tasas con centésimas e importes altos"""
+    rng = random.Random(semilla)
+    p = caso_aleatorio(rng)
+    p["meses_total"] = meses_total
+    p["no_cobro_inicial"] = 3.33
+    p["reinversiones_compra"] = []
+    p["reinversiones_colocacion"] = [
+        dict(_reinversion_aleatoria(rng), mes=rng.randint(1, meses_total - 60),
+             importe=rng.randint(1, 3_000_000), no_cobro=round(rng.uniform(0, 40), 2))
+        for _ in range(reinversiones)
+    ]
+    return p
+
+
+def medir_exacto(semilla, repeticiones=30):
+    """Mediana en ms de calcular_flujo_array en punto flotante y en modo exacto"""
+    p = caso_rendimiento(semilla)
+    tiempos = {}
+    for exacto in (False, True):
+        q = dict(p, exacto=exacto)
+        calcular_flujo_array(q)
+        muestras = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            calcular_flujo_array(q)
+            muestras.append(time.perf_counter() - inicio)
+        tiempos[exacto] = float(np.median(muestras)) * 1000
+    return tiempos[False], tiempos[True]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verificación aleatoria del motor de flujo de caja")
+    parser.add_argument("--casos", type=int, default=100, help="Casos aleatorios por verificación")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla del primer caso")
+    parser.add_argument("--rendimiento", action="store_true", help="Medir el modo exacto contra punto flotante")
+    args = parser.parse_args()
+
+    fallas = []
+    maxima, f = verificar_flujo(args.casos, args.semilla)
+    print(f"flujo                   {args.casos} casos, diferencia máxima {maxima:g}")
+    fallas += f
+    maxima, f = verificar_estres(args.casos, args.semilla)
+    print(f"estres                  {args.casos} casos, diferencia máxima {maxima:g}")
+    fallas += f
+    comparadas, f = verificar_reinversion_automatica(args.casos, args.semilla)
+    print(f"reinversion_automatica  {comparadas} casos comparados")
+    fallas += f
+    f = verificar_exacto(args.casos, args.semilla)
+    print(f"exacto                  {args.casos} casos conciliados")
+    fallas += f
+    if args.rendimiento:
+        flotante, exacto = medir_exacto(args.semilla)
+        print(f"rendimiento             flotante {flotante:.2f} ms, exacto {exacto:.2f} ms "
+              f"({exacto / flotante:.2f}x)")
+
+    for falla in fallas:
+        print(f"Falla: {falla}")
+    print("Sin diferencias" if not fallas else f"{len(fallas)} fallas")
+    return 1 if fallas else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())